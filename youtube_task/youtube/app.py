@@ -4,7 +4,9 @@ from video_downloader.app import app as video_downloader
 from transcript_downloader.app import app as transcript_downloader
 from thumbnail_downloader.app import app as thumbnail_downloader
 from channel_downloader.app import app as channel_downloader
-from persistence import load_persistent_state, save_persistent_state, clear_persistent_state
+from persistence import load_persistent_state, set_state_value, clear_persistent_state
+from rate_limit import rate_limiter_stats
+from storage import storage_stats, set_storage_quota
 import re, datetime
 
 # Set page configuration with the new app name.
@@ -12,7 +14,7 @@ st.set_page_config(page_title="Youtube Task", layout="wide")
 
 # --- Load persistent state from disk ---
 if "persistent_state" not in st.session_state:
-    st.session_state["persistent_state"] = load_persistent_state()
+    st.session_state["persistent_state"] = load_persistent_state(include_transcripts=False)
 persistent_state = st.session_state["persistent_state"]
 
 # On startup, if a cookie string is saved in persistent state, load it into session state.
@@ -97,19 +99,55 @@ if cookies_input:
         else:
             st.sidebar.info(f"Cookies valid until {latest.strftime('%Y-%m-%d')} (earliest expiry: {earliest.strftime('%Y-%m-%d')})")
             # Save the valid cookies into persistent state.
+            latest_expiry = latest.strftime("%Y-%m-%d")
+            if persistent_state.get("youtube_cookies") != cookies_input:
+                set_state_value("youtube_cookies", cookies_input)
+            if persistent_state.get("youtube_cookies_latest_expiry") != latest_expiry:
+                set_state_value("youtube_cookies_latest_expiry", latest_expiry)
             persistent_state["youtube_cookies"] = cookies_input
-            persistent_state["youtube_cookies_latest_expiry"] = latest.strftime("%Y-%m-%d")
-            save_persistent_state(persistent_state)
+            persistent_state["youtube_cookies_latest_expiry"] = latest_expiry
             st.session_state["persistent_state"] = persistent_state
     else:
         st.sidebar.warning("Could not parse expiry date from cookies. Ensure your cookies include expiry information in Netscape format.")
 
+# --- Current request rates per host (shared by all pages and sessions) ---
+limiter_stats = rate_limiter_stats()
+if limiter_stats:
+    with st.sidebar.expander("Request Rate Limits"):
+        for host, stats in limiter_stats.items():
+            st.write(
+                f"**{host}**: {stats['rate']} req/s, {stats['queue_depth']} waiting, "
+                f"{stats['requests']} sent, {stats['throttled']} throttled"
+            )
+
+# --- Disk used by downloaded videos and thumbnails (least recently used evicted over quota) ---
+def update_storage_quota(kind: str) -> None:
+    set_storage_quota(kind, st.session_state[f"storage_quota_{kind}"] * 1024 ** 2)
+
+with st.sidebar.expander("Storage"):
+    for kind, stats in storage_stats().items():
+        hit_rate = "n/a" if stats["hit_rate"] is None else f"{stats['hit_rate']:.0%}"
+        st.write(
+            f"**{kind}**: {stats['used'] / 1024 ** 2:.1f} of {stats['quota'] / 1024 ** 2:.0f} MB "
+            f"in {stats['files']} files, {hit_rate} hit rate, "
+            f"{stats['evicted_bytes'] / 1024 ** 2:.1f} MB evicted ({stats['evicted_files']} files)"
+        )
+        st.number_input(
+            f"{kind.capitalize()} quota (MB)",
+            min_value=1,
+            value=max(1, stats["quota"] // 1024 ** 2),
+            step=100,
+            key=f"storage_quota_{kind}",
+            on_change=update_storage_quota,
+            args=(kind,),
+        )
+
 # --- Button to Clear Persistent State (including cookies) ---
 if st.sidebar.button("Clear Persistent State Including Files"):
     new_state = clear_persistent_state()
     st.session_state["persistent_state"] = new_state
     st.session_state.youtube_cookies = ""
-    st.experimental_rerun()
+    st.rerun()
 # Main content area navigation.
 if page == "About":
     about_page()
@@ -0,0 +1,71 @@
+import argparse
+import random
+import sys
+import time
+from subtitles import iter_segments, normalize_segments, segments_text
+
+# Benchmark for the caption normalization in subtitles.py:
+#
+#   python benchmark_subtitles.py --words 120000
+#
+# Parses synthetic captions shaped like YouTube's rolling auto-captions and
+# prints the size of the text kept by a plain line filter and by
+# normalize_segments, plus the parse time.
+
+def _rolling_caption_vtt(words: list, words_per_line: int = 7) -> str:
+    # Mimics YouTube auto-captions: each line first appears word by word with
+    # karaoke tags below the previous line, then is repeated in a 10 ms
+    # transition cue and again as the top line of the next cue.
+    cues = ["WEBVTT\nKind: captions\nLanguage: en\n"]
+    previous = " "
+    t = 0.0
+
+    def stamp(seconds):
+        return f"{int(seconds // 3600):02d}:{int(seconds % 3600 // 60):02d}:{seconds % 60:06.3f}"
+
+    for i in range(0, len(words), words_per_line):
+        line_words = words[i:i + words_per_line]
+        tagged = line_words[0] + "".join(
+            f"<{stamp(t + 0.3 * (n + 1))}><c> {word}</c>" for n, word in enumerate(line_words[1:])
+        )
+        line = " ".join(line_words)
+        cues.append(f"{stamp(t)} --> {stamp(t + 2.0)} align:start position:0%\n{previous}\n{tagged}\n")
+        cues.append(f"{stamp(t + 2.0)} --> {stamp(t + 2.01)} align:start position:0%\n{line}\n \n")
+        previous = line
+        t += 2.01
+    return "\n".join(cues)
+
+def benchmark_normalization(word_count: int = 120000) -> dict:
+    """
+    Parses a synthetic auto-caption file shaped like YouTube's (a multi-hour
+    stream at the default size) and reports how much text the normalization
+    stage removes compared with keeping every caption line.
+    """
+    vocabulary = "the of and to in is you that it he was for on are as with his they at be this have from".split()
+    rng = random.Random(0)
+    vtt = _rolling_caption_vtt([rng.choice(vocabulary) for _ in range(word_count)])
+    started = time.perf_counter()
+    segments = list(normalize_segments(iter_segments(iter([vtt]))))
+    elapsed = time.perf_counter() - started
+    # What the plain line filter kept: every non-timing, non-header line.
+    kept_lines = [line for line in vtt.splitlines() if line.strip() and "-->" not in line and "WEBVTT" not in line]
+    raw_size = len("\n".join(kept_lines).encode("utf-8"))
+    clean_size = len(segments_text(segments).encode("utf-8"))
+    return {
+        "caption_bytes": len(vtt.encode("utf-8")),
+        "line_filter_bytes": raw_size,
+        "normalized_bytes": clean_size,
+        "reduction": round(1 - clean_size / raw_size, 3),
+        "segments": len(segments),
+        "seconds": round(elapsed, 3),
+    }
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Measure how much text caption normalization removes.")
+    parser.add_argument("--words", type=int, default=120000, help="words in the synthetic captions (default 120000)")
+    args = parser.parse_args(argv)
+    print(benchmark_normalization(args.words))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+import hashlib
+import os
+import tempfile
+import zlib
+
+# Content-addressed store for large payloads (transcript bodies). Each blob is
+# zlib-compressed and saved as BLOB_DIR/<first two hex chars>/<sha256>.z, so
+# identical content is only ever stored once.
+BLOB_DIR = "data/blobs"
+COMPRESSION_LEVEL = 9
+READ_CHUNK_SIZE = 64 * 1024
+
+def blob_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def blob_path(digest: str) -> str:
+    return os.path.join(BLOB_DIR, digest[:2], digest + ".z")
+
+def put_blob(data: bytes) -> str:
+    """Stores data (if not already present) and returns its content hash."""
+    digest = blob_hash(data)
+    path = blob_path(digest)
+    if os.path.exists(path):
+        return digest
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write to a temporary file first so readers never see a partial blob.
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(zlib.compress(data, COMPRESSION_LEVEL))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return digest
+
+def iter_blob(digest: str, chunk_size: int = READ_CHUNK_SIZE):
+    """Streams a blob's decompressed content in chunks without loading the file."""
+    decompressor = zlib.decompressobj()
+    with open(blob_path(digest), "rb") as f:
+        while True:
+            compressed = f.read(chunk_size)
+            if not compressed:
+                break
+            data = decompressor.decompress(compressed)
+            if data:
+                yield data
+    tail = decompressor.flush()
+    if tail:
+        yield tail
+
+def read_blob(digest: str) -> bytes:
+    return b"".join(iter_blob(digest))
+
+def delete_blob(digest: str) -> None:
+    try:
+        os.remove(blob_path(digest))
+    except FileNotFoundError:
+        pass
+
+def iter_blob_hashes():
+    """Yields the hash of every blob currently on disk."""
+    if not os.path.isdir(BLOB_DIR):
+        return
+    for prefix in os.listdir(BLOB_DIR):
+        prefix_dir = os.path.join(BLOB_DIR, prefix)
+        if not os.path.isdir(prefix_dir):
+            continue
+        for name in os.listdir(prefix_dir):
+            if name.endswith(".z"):
+                yield name[:-2]
+
+def collect_garbage(referenced: set) -> int:
+    """Deletes every blob whose hash is not in referenced; returns the count removed."""
+    removed = 0
+    for digest in list(iter_blob_hashes()):
+        if digest not in referenced:
+            delete_blob(digest)
+            removed += 1
+    return removed
@@ -1,6 +1,11 @@
+import re
+from datetime import date, timedelta
 import streamlit as st
-from channel_downloader.callbacks import fetch_channel_videos
+from channel_downloader.callbacks import channel_filters, fetch_channel_videos, fetch_many_channels
+from channel_downloader.config import default_channel_workers, default_channel_filter_days
+from channel_downloader.yt_channel_download import CONTENT_TYPES
 from channel_downloader.state import state_init, state_reset
+from export import EXPORT_FORMATS, CHANNEL_COLUMNS, CHANNEL_BATCH_COLUMNS, export_file, frame_rows
 
 def app():
     state_init()
@@ -64,11 +69,41 @@ def app():
     channel_name = st.text_input(
         label="YouTube Channel Name",
         value=st.session_state.channel_name,
-        placeholder="e.g., Sam Eckholm",
+        placeholder="e.g., Sam Eckholm, @handle or a channel URL",
     )
 
     # Fetch Video IDs Button
     st.markdown("### 📋 Fetch Channel Videos")
+    incremental = st.checkbox(
+        "Only look for new uploads",
+        value=True,
+        help="Stops at the first video already in the saved listing of this channel. "
+             "Untick to list the whole channel again.",
+    )
+    # Filters are applied while the listing is paged, so a small selection
+    # stops after a page or two instead of walking the whole channel.
+    with st.expander("🔎 Filters"):
+        content_type = st.selectbox("Content", CONTENT_TYPES, format_func=str.capitalize)
+        limit = st.number_input("Only the latest N videos (0 for all)", min_value=0, value=0, step=10)
+        use_dates = st.checkbox(
+            "Only videos uploaded between",
+            help="Upload times come from YouTube's \"3 weeks ago\" labels, so the bounds are approximate. "
+                 "Shorts carry no upload time and are never filtered out by date.",
+        )
+        today = date.today()
+        date_range = st.date_input(
+            "Upload dates",
+            value=(today - timedelta(days=default_channel_filter_days), today),
+            max_value=today,
+            disabled=not use_dates,
+        )
+        title_pattern = st.text_input("Title matches (regular expression, case-insensitive)")
+    try:
+        filters = channel_filters(content_type, limit, date_range if use_dates else (), title_pattern)
+    except re.error as e:
+        st.error(f"Invalid title pattern: {e}")
+        filters = None
+
     fetch_btn = st.button(
         "🔍 Fetch Video IDs",
         type="primary",
@@ -76,28 +111,34 @@ def app():
     )
 
     # Process if button is clicked
-    if fetch_btn:
-        if channel_name != st.session_state.channel_name:
+    if fetch_btn and filters is not None:
+        if channel_name != st.session_state.channel_name or filters != st.session_state.channel_filters:
             state_reset()
         if st.session_state.channel_fetch_count == 0:
-            df_table, df_download = fetch_channel_videos(channel_name)
-            st.session_state.channel_data_table = df_table
-            st.session_state.channel_data_download = df_download
-            st.session_state.channel_fetch_count += 1
+            df_table = fetch_channel_videos(channel_name, incremental, filters)
+            if df_table is not None:
+                st.session_state.channel_data_table = df_table
+                st.session_state.channel_filters = filters
+                st.session_state.channel_fetch_count += 1
 
-    # Video ID List Preview and Download CSV Button
+    # Video ID List Preview and Download Button
     if "channel_data_table" in st.session_state and not st.session_state.channel_data_table.empty:
         st.markdown("### 🎥 Video ID List")
         st.dataframe(st.session_state.channel_data_table)
         
-        st.markdown("### 📥 Download Video Information (CSV)")
-        # Prefix CSV file name with the channel name
-        csv_filename = f"{channel_name}_channel_data.csv"
+        st.markdown("### 📥 Download Video Information")
+        channel_df = st.session_state.channel_data_table
+        export_format = st.selectbox(
+            "Format", [name for name in EXPORT_FORMATS if name != "TXT"], key="channel_export_format"
+        )
+        extension, mime, _ = EXPORT_FORMATS[export_format]
+        # Prefix the file name with the channel name
+        export_filename = f"{channel_name}_channel_data.{extension}"
         st.download_button(
             label="📥 Download Video IDs",
-            data=st.session_state.channel_data_download,
-            file_name=csv_filename,
-            mime="text/csv",
+            data=lambda: export_file(frame_rows(channel_df), export_format, CHANNEL_COLUMNS),
+            file_name=export_filename,
+            mime=mime,
             type="primary",
             key="button-download",
             disabled=False if st.session_state.channel_fetch_count > 0 else True,
@@ -107,17 +148,53 @@ def app():
     st.markdown("--- ")
     if "channel_data_table" in st.session_state and not st.session_state.channel_data_table.empty:
         st.markdown("### 📥 Download Video URLs (.txt)")
-        # Get the list of URLs from the DataFrame
-        video_urls = st.session_state.channel_data_table["youtube_url"].tolist()
-        # Join the URLs into a comma-separated string
-        video_urls_txt = ", ".join(video_urls)
+        video_urls = st.session_state.channel_data_table["youtube_url"]
         # Prefix TXT file name with the channel name
         txt_filename = f"{channel_name}_video_urls.txt"
         
         st.download_button(
             label="📥 Download Video URLs",
-            data=video_urls_txt,
+            # Comma-separated, joined only when the download is requested
+            data=lambda: ", ".join(video_urls),
             file_name=txt_filename,
             mime="text/plain",
             key="button-download-urls",
         )
+
+    # Batch mode: list a whole watch-list of channels into one dataset
+    st.markdown("---")
+    st.markdown("### 📚 List Many Channels")
+    batch_names = st.text_area(
+        "Channel names, @handles or channel URLs (one per line)",
+        key="channel_batch_names",
+    )
+    batch_workers = st.slider(
+        "Parallel channel listings", min_value=1, max_value=32, value=default_channel_workers
+    )
+    if st.button("📚 List All Channels", key="button-fetch-batch") and filters is not None:
+        names = list(dict.fromkeys(line.strip() for line in batch_names.splitlines() if line.strip()))
+        if names:
+            table, summary = fetch_many_channels(names, batch_workers, incremental, filters)
+            st.session_state.channel_batch_table = table
+            st.session_state.channel_batch_summary = summary
+        else:
+            st.error("Enter at least one channel.")
+
+    if st.session_state.channel_batch_summary is not None:
+        summary = st.session_state.channel_batch_summary
+        batch_table = st.session_state.channel_batch_table
+        listed = int((summary["status"] == "ok").sum())
+        st.write(f"{batch_table.num_rows} videos from {listed} of {len(summary)} channels.")
+        st.dataframe(summary)
+        batch_formats = [name for name in EXPORT_FORMATS if name != "TXT"]
+        batch_format = st.selectbox(
+            "Format", batch_formats, index=batch_formats.index("Parquet"), key="channel_batch_export_format"
+        )
+        extension, mime, _ = EXPORT_FORMATS[batch_format]
+        st.download_button(
+            label="📥 Download All Channels",
+            data=lambda: export_file(batch_table, batch_format, CHANNEL_BATCH_COLUMNS),
+            file_name=f"channels.{extension}",
+            mime=mime,
+            key="button-download-batch",
+        )
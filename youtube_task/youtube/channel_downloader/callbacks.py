@@ -1,22 +1,117 @@
-from channel_downloader.yt_channel_download import get_channel_videos
-import pandas as pd
+import re
+from datetime import datetime, time
 import streamlit as st
+from channel_downloader.yt_channel_download import (
+    ChannelFilters,
+    get_channel_id_from_name,
+    iter_channel_videos,
+    iter_channel_listings_concurrently,
+)
+from channel_downloader.config import default_table_refresh_rows, default_channel_workers
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+def videos_frame(videos: list) -> pd.DataFrame:
+    """Builds the channel table (youtube_url, video_id, video_title) from ChannelVideo records."""
+    df_table = pd.DataFrame(videos, columns=["video_id", "video_title"])
+    df_table.insert(0, "youtube_url", "https://www.youtube.com/watch?v=" + df_table["video_id"])
+    return df_table
+
+def channel_filters(content_type: str, limit: int, date_range, title_pattern: str) -> ChannelFilters:
+    """
+    Builds the listing filters from the filter widgets: limit 0 means no limit,
+    date_range is () or a (first, last) pair of dates (both days included; a
+    single date while the range is being picked). Raises re.error for an
+    invalid title pattern.
+    """
+    if title_pattern:
+        re.compile(title_pattern)
+    published_after = published_before = None
+    if date_range:
+        published_after = datetime.combine(date_range[0], time.min).timestamp()
+        published_before = datetime.combine(date_range[-1], time.max).timestamp()
+    return ChannelFilters(
+        limit=limit or None,
+        published_after=published_after,
+        published_before=published_before,
+        content_type=content_type,
+        title_pattern=title_pattern or None,
+    )
 
-@st.cache_data
-def convert_df(df: pd.DataFrame) -> bytes:
-    # IMPORTANT: Cache the conversion to prevent computation on every rerun
-    return df.to_csv().encode("utf-8")
+def fetch_channel_videos(channel_name: str, incremental: bool = True, filters: ChannelFilters = None):
+    """
+    Lists the channel while showing the rows received so far; returns the full
+    table, or None if the channel cannot be found or listed.
+    """
+    st.write("INFO: starting channel video id puller...")
+    channel_id = get_channel_id_from_name(channel_name, st.session_state.get("youtube_cookies", ""), log=st.write)
+    if channel_id is None:
+        return None
+    progress = st.empty()
+    table = st.empty()
+    videos = []
+    shown = 0
+    try:
+        for video in iter_channel_videos(channel_id, incremental, log=st.write, filters=filters):
+            videos.append(video)
+            if len(videos) - shown >= max(default_table_refresh_rows, shown):
+                table.dataframe(videos_frame(videos))
+                shown = len(videos)
+            if len(videos) % default_table_refresh_rows == 0:
+                progress.caption(f"{len(videos)} videos listed so far...")
+    except Exception as e:
+        st.write(f"FAILURE: listing channel {channel_id} failed with exception {e}")
+        return None
+    finally:
+        progress.empty()
+        table.empty()
+    st.write("...done!")
+    return videos_frame(videos)
 
-def fetch_channel_videos(channel_name: str):
-    # Now get three outputs: video_ids, video_urls, video_titles
-    video_ids, video_urls, video_titles = get_channel_videos(channel_name)
-    if video_ids is not None and video_urls is not None and video_titles is not None:
-        # Build DataFrame with three columns
-        df_table = pd.DataFrame({
-            "youtube_url": video_urls,
-            "video_id": video_ids,
-            "video_title": video_titles,
+def fetch_many_channels(
+    channel_names: list,
+    max_workers: int = default_channel_workers,
+    incremental: bool = True,
+    filters: ChannelFilters = None,
+):
+    """
+    Lists many channels concurrently. Returns (table, summary): one Arrow
+    table with a channel column (channel, youtube_url, video_id, video_title)
+    holding every listed video, and a DataFrame with one status row per
+    channel. Channels that fail are reported in the summary and skipped.
+    """
+    columns = {"channel": [], "video_id": [], "video_title": []}
+    summary_rows = []
+    progress_bar = st.progress(0)
+    alert_placeholder = st.empty()
+    cookies = st.session_state.get("youtube_cookies", "")
+    listings = iter_channel_listings_concurrently(channel_names, max_workers, cookies, incremental, filters)
+    for done, (channel_name, channel_id, videos, messages) in enumerate(listings, start=1):
+        if videos is None:
+            status = messages[-1] if messages else "failed"
+            alert_placeholder.warning(f"{channel_name}: {status}")
+        else:
+            status = "ok"
+            columns["channel"].extend([channel_name] * len(videos))
+            columns["video_id"].extend(video.video_id for video in videos)
+            columns["video_title"].extend(video.title for video in videos)
+            alert_placeholder.info(f"Listed {len(videos)} videos for {channel_name} ({done}/{len(channel_names)})")
+        summary_rows.append({
+            "channel": channel_name,
+            "channel_id": channel_id or "",
+            "videos": 0 if videos is None else len(videos),
+            "status": status,
         })
-        df_download = convert_df(df_table)
-        return df_table, df_download
-    return None, None
+        progress_bar.progress(done / len(channel_names))
+    alert_placeholder.empty()
+    video_ids = pa.array(columns["video_id"], pa.string())
+    table = pa.table({
+        # Repeated once per video, so stored dictionary-encoded
+        "channel": pa.array(columns["channel"], pa.string()).dictionary_encode(),
+        "youtube_url": pc.binary_join_element_wise("https://www.youtube.com/watch?v=", video_ids, ""),
+        "video_id": video_ids,
+        "video_title": pa.array(columns["video_title"], pa.string()),
+    })
+    summary = pd.DataFrame(summary_rows, columns=["channel", "channel_id", "videos", "status"])
+    return table, summary
@@ -1 +1,13 @@
 default_channel_name = "Sam Eckholm"
+# Channel names resolved through a search are remembered for this long; names
+# that found no channel are searched for again after the shorter not-found TTL.
+default_channel_resolution_ttl_hours = 30 * 24
+default_channel_not_found_ttl_hours = 24
+# While a channel is being listed the table is redrawn once the listing has
+# grown by this many rows and then each time it doubles, so the first page
+# shows up right away without resending a big table for every page.
+default_table_refresh_rows = 30
+# Channels resolved and listed in parallel in batch mode.
+default_channel_workers = 8
+# Upload window preselected when the date filter is switched on.
+default_channel_filter_days = 30
@@ -6,17 +6,19 @@ def state_init():
     df = pd.DataFrame(columns=["youtube_url", "video_id", "video_title"])  # added video_title column
     if "channel_data_table" not in st.session_state:
         st.session_state.channel_data_table = df
-    if "channel_data_download" not in st.session_state:
-        st.session_state.channel_data_download = df.to_csv().encode("utf-8")
     if "channel_name" not in st.session_state:
         st.session_state.channel_name = default_channel_name
     if "channel_fetch_count" not in st.session_state:
         st.session_state.channel_fetch_count = 0
+    if "channel_filters" not in st.session_state:
+        st.session_state.channel_filters = None
+    if "channel_batch_table" not in st.session_state:
+        st.session_state.channel_batch_table = None
+    if "channel_batch_summary" not in st.session_state:
+        st.session_state.channel_batch_summary = None
 
 def state_reset():
     df = pd.DataFrame(columns=["youtube_url", "video_id", "video_title"])  # added video_title column
     if "channel_data_table" not in st.session_state:
         st.session_state.channel_data_table = df
-    if "channel_data_download" not in st.session_state:
-        st.session_state.channel_data_download = df.to_csv().encode("utf-8")
     st.session_state.channel_fetch_count = 0
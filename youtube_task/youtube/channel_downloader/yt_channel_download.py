@@ -1,61 +1,103 @@
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import yt_dlp
 import scrapetube
-from typing import Tuple
-import streamlit as st
-import tempfile
+from typing import NamedTuple, Optional, Tuple
+from channel_downloader.config import (
+    default_channel_resolution_ttl_hours,
+    default_channel_not_found_ttl_hours,
+    default_channel_workers,
+)
+from metadata import cookiefile_for, video_url
+from persistence import get_cached_channel_id, cache_channel_id, load_channel_listing, save_channel_listing
+from rate_limit import rate_limited, get_rate_limiter, is_throttle_error, YOUTUBE_HOST
 
-def get_channel_id_from_name(channel_name: str) -> str | None:
+# scrapetube fetches a channel listing in pages of about this many videos; one
+# rate-limiter token is taken per page instead of scrapetube's fixed sleep.
+SCRAPETUBE_PAGE_SIZE = 30
+
+# Channel inputs that name a channel exactly (ID, @handle or channel URL) are
+# listed without any search; only plain names go through a (cached) search.
+CHANNEL_ID_PATTERN = re.compile(r"^UC[A-Za-z0-9_-]{22}$")
+CHANNEL_HANDLE_PATTERN = re.compile(r"^@[\w.-]+$")
+CHANNEL_URL_PATTERN = re.compile(
+    r"^(?:https?://)?(?:(?:www|m)\.)?youtube\.com/"
+    r"(?:channel/(UC[A-Za-z0-9_-]{22})|(@[\w.-]+)|((?:c|user)/[\w.-]+))(?:[/?#].*)?$"
+)
+
+# Channel tabs scrapetube can list; only "videos" listings are kept in the store.
+CONTENT_TYPES = ("videos", "shorts", "streams")
+# Listings only carry a relative upload time ("3 weeks ago", "Streamed 2 days ago").
+PUBLISHED_AGO_PATTERN = re.compile(r"(\d+)\s+(second|minute|hour|day|week|month|year)s?\s+ago")
+AGO_UNIT_SECONDS = {
+    "second": 1,
+    "minute": 60,
+    "hour": 3600,
+    "day": 86400,
+    "week": 7 * 86400,
+    "month": 30 * 86400,
+    "year": 365 * 86400,
+}
+
+def parse_channel_reference(text: str) -> str | None:
     """
-    Uses yt-dlp to search for the channel by name and returns its channel_id.
-    If an error occurs that suggests a signin issue and cookies are available in session state,
-    a retry is attempted with the cookiefile option attached.
+    Returns what a channel can be listed by without a search: the channel ID
+    for UC... IDs and /channel/ URLs, or a canonical channel URL for @handles
+    and /c/ or /user/ URLs. Returns None for anything else (a name).
     """
-    # Base options
+    text = (text or "").strip()
+    if CHANNEL_ID_PATTERN.match(text):
+        return text
+    if CHANNEL_HANDLE_PATTERN.match(text):
+        return f"https://www.youtube.com/{text.lower()}"
+    match = CHANNEL_URL_PATTERN.match(text)
+    if not match:
+        return None
+    channel_id, handle, path = match.groups()
+    return channel_id or f"https://www.youtube.com/{handle.lower() if handle else path}"
+
+def _search_channel_id(channel_name: str, cookies: str) -> str:
+    """Searches for the channel with yt-dlp; "" if nothing is found, raises if the search fails."""
     ydl_opts = {
         "quiet": True,
         "skip_download": True,
         "extract_flat": True,
         "force_generic_extractor": True,
     }
-    
-    # If cookies are available, attach them.
-    cookies = st.session_state.get("youtube_cookies", "").strip() if "youtube_cookies" in st.session_state else ""
-    if cookies:
-        try:
-            cookie_file = tempfile.NamedTemporaryFile(delete=False, suffix=".txt")
-            cookie_file.write(cookies.encode("utf-8"))
-            cookie_file.close()
-            ydl_opts["cookiefile"] = cookie_file.name
-            st.write("DEBUG: Attached cookie file for channel lookup:", cookie_file.name)
-        except Exception as ce:
-            st.warning("Failed to attach cookies in channel lookup: " + str(ce))
-    
-    # Try the initial extraction
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+    cookie_file = cookiefile_for(cookies)
+    if cookie_file:
+        ydl_opts["cookiefile"] = cookie_file
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl, rate_limited(YOUTUBE_HOST):
+        info = ydl.extract_info(f"ytsearch1:{channel_name}", download=False)
+    entries = info.get("entries") or [{}]
+    return entries[0].get("channel_id") or ""
+
+def get_channel_id_from_name(channel_name: str, cookies: str = "", log=print) -> str | None:
+    """
+    Returns what the channel is listed by (see parse_channel_reference), or
+    None if it cannot be found. Plain names are looked up with a yt-dlp
+    search whose result, found or not, is kept in the store for a while.
+    """
+    reference = parse_channel_reference(channel_name)
+    if reference:
+        return reference
+    name = " ".join(channel_name.split()).casefold()
+    channel_id = get_cached_channel_id(
+        name, default_channel_resolution_ttl_hours * 3600, default_channel_not_found_ttl_hours * 3600
+    )
+    if channel_id is None:
         try:
-            info = ydl.extract_info(f"ytsearch1:{channel_name}", download=False)
-            return info["entries"][0]["channel_id"]
+            channel_id = _search_channel_id(channel_name, cookies)
         except Exception as e:
-            st.write("Channel search error: " + str(e))
-            # If error message suggests signin and cookies exist but were not attached, try again.
-            if "signin" in str(e).lower() and cookies and not ydl_opts.get("cookiefile"):
-                st.write("Retrying channel search with cookies...")
-                try:
-                    cookie_file = tempfile.NamedTemporaryFile(delete=False, suffix=".txt")
-                    cookie_file.write(cookies.encode("utf-8"))
-                    cookie_file.close()
-                    ydl_opts["cookiefile"] = cookie_file.name
-                    st.write("DEBUG: Attached cookie file on retry:", cookie_file.name)
-                except Exception as ce:
-                    st.warning("Failed to attach cookies on retry: " + str(ce))
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl_retry:
-                    try:
-                        info = ydl_retry.extract_info(f"ytsearch1:{channel_name}", download=False)
-                        return info["entries"][0]["channel_id"]
-                    except Exception as e2:
-                        st.write("Retry with cookies failed: " + str(e2))
-                        return None
+            # Not cached: the search itself failed, so the next call tries again.
+            log("Channel search error: " + str(e))
             return None
+        cache_channel_id(name, channel_id)
+    if not channel_id:
+        log(f"No channel found for '{channel_name}'.")
+        return None
+    return channel_id
 
 def extract_title(raw_title) -> str:
     """
@@ -64,6 +106,8 @@ def extract_title(raw_title) -> str:
     if isinstance(raw_title, str):
         return raw_title
     if isinstance(raw_title, dict):
+        if "simpleText" in raw_title:
+            return raw_title["simpleText"]
         if "runs" in raw_title and isinstance(raw_title["runs"], list):
             return "".join([run.get("text", "") for run in raw_title["runs"]])
         if "accessibility" in raw_title:
@@ -73,40 +117,189 @@ def extract_title(raw_title) -> str:
                 return label
     return str(raw_title)
 
-def get_videourl_from_channel_id(channel_id: str) -> Tuple[list, list, list] | Tuple[None, None, None]:
+class ChannelVideo(NamedTuple):
+    """One row of a channel listing."""
+    video_id: str
+    title: str
+
+    @property
+    def url(self) -> str:
+        return video_url(self.video_id)
+
+class ChannelFilters(NamedTuple):
+    """
+    What to keep of a channel listing. limit caps the number of videos kept;
+    published_after/published_before (Unix times) bound the upload time, to
+    the precision of YouTube's "N weeks ago"; content_type picks the channel
+    tab (see CONTENT_TYPES); title_pattern is a case-insensitive regex that
+    titles must contain a match for.
+    """
+    limit: Optional[int] = None
+    published_after: Optional[float] = None
+    published_before: Optional[float] = None
+    content_type: str = "videos"
+    title_pattern: Optional[str] = None
+
+    @property
+    def dated(self) -> bool:
+        return self.published_after is not None or self.published_before is not None
+
+def published_time(video: dict, now: float) -> float | None:
+    """Approximate upload time of a scrapetube item (None for items without one, like shorts)."""
+    match = PUBLISHED_AGO_PATTERN.search(extract_title(video.get("publishedTimeText", "")))
+    if not match:
+        return None
+    return now - int(match.group(1)) * AGO_UNIT_SECONDS[match.group(2)]
+
+def iter_channel_videos(channel_id: str, incremental: bool = True, log=print, filters: ChannelFilters = None):
+    """
+    Yields a channel's videos as ChannelVideo records, newest first, as the
+    listing pages come in. channel_id may also be a channel URL (see
+    parse_channel_reference). In incremental mode paging stops at the first
+    video that is already in the stored listing, and the stored rows follow;
+    otherwise (or if the channel was never listed) the whole channel is walked.
+
+    filters (see ChannelFilters) are applied while paging: no page is
+    requested once the limit is reached or the listing has gone past
+    published_after. Stored rows carry no upload time, so a date filter
+    always pages through the live listing.
+
+    The stored listing is updated only when paging ran to its natural end; a
+    consumer or filter that stops it early leaves it as it was. Raises if the
+    listing fails.
+    """
+    filters = filters or ChannelFilters()
+    if filters.content_type not in CONTENT_TYPES:
+        raise ValueError(f"unknown content type {filters.content_type!r}")
+    title_regex = re.compile(filters.title_pattern, re.IGNORECASE) if filters.title_pattern else None
+    use_store = filters.content_type == "videos"
+    stored = load_channel_listing(channel_id) if use_store and incremental and not filters.dated else []
+    known_ids = {video_id for video_id, _ in stored}
+    limiter = get_rate_limiter(YOUTUBE_HOST)
+    limiter.acquire()
+    if channel_id.startswith("https://"):
+        videos = scrapetube.get_channel(channel_url=channel_id, sleep=0, content_type=filters.content_type)
+    else:
+        videos = scrapetube.get_channel(channel_id, sleep=0, content_type=filters.content_type)
+    now = time.time()
+    new_videos = []
+    kept = 0
+    stopped_early = False
     try:
-        videos = scrapetube.get_channel(channel_id)
-        video_urls = []
-        video_ids = []
-        video_titles = []  # New list for titles
-        for video in videos:
+        for count, video in enumerate(videos, start=1):
             vid = video["videoId"]
-            raw_title = video.get("title", "No Title")
-            title = extract_title(raw_title)
-            vurl = "https://www.youtube.com/watch?v=" + vid
-            video_ids.append(vid)
-            video_urls.append(vurl)
-            video_titles.append(title)
-        return video_ids, video_urls, video_titles
+            if vid in known_ids:
+                # Everything from here on is already stored.
+                break
+            record = ChannelVideo(vid, extract_title(video.get("title", "No Title")))
+            new_videos.append(record)
+            published = published_time(video, now) if filters.dated else None
+            if published is not None and filters.published_after is not None and published < filters.published_after:
+                # Newest first: every later video is older still.
+                stopped_early = True
+                break
+            if count % SCRAPETUBE_PAGE_SIZE == 0:
+                # The next item comes from a new page request.
+                limiter.acquire()
+            if published is not None and filters.published_before is not None and published > filters.published_before:
+                continue
+            if title_regex and not title_regex.search(record.title):
+                continue
+            yield record
+            kept += 1
+            if filters.limit is not None and kept >= filters.limit:
+                stopped_early = True
+                break
+    except Exception as e:
+        if is_throttle_error(e):
+            limiter.on_throttle()
+        raise
+    finally:
+        # Stops scrapetube from requesting further pages.
+        videos.close()
+    if use_store and not stopped_early:
+        save_channel_listing(channel_id, new_videos, complete=not known_ids)
+    if known_ids:
+        log(f"INFO: {len(new_videos)} new video(s) since the last listing of {channel_id}")
+    for video_id, title in stored:
+        if filters.limit is not None and kept >= filters.limit:
+            break
+        if title_regex and not title_regex.search(title):
+            continue
+        kept += 1
+        yield ChannelVideo(video_id, title)
+
+def get_videourl_from_channel_id(
+    channel_id: str, log=print, incremental: bool = True, filters: ChannelFilters = None
+) -> Tuple[list, list, list] | Tuple[None, None, None]:
+    """Collects iter_channel_videos into (video_ids, video_urls, video_titles)."""
+    try:
+        listing = list(iter_channel_videos(channel_id, incremental, log, filters))
     except Exception as e:
-        st.write(f"FAILURE: get_videourls_from_channel_id failed with exception {e}")
+        log(f"FAILURE: get_videourls_from_channel_id failed with exception {e}")
         return None, None, None
+    return [v.video_id for v in listing], [v.url for v in listing], [v.title for v in listing]
 
-def get_channel_videos(channel_name: str) -> Tuple[list, list, list] | Tuple[None, None, None]:
+def _list_channel_in_worker(channel_name: str, cookies: str, incremental: bool, filters: ChannelFilters) -> tuple:
+    messages = []
+    channel_id = None
+    try:
+        channel_id = get_channel_id_from_name(channel_name, cookies, messages.append)
+        if channel_id is None:
+            return channel_id, None, messages
+        return channel_id, list(iter_channel_videos(channel_id, incremental, messages.append, filters)), messages
+    except Exception as e:
+        messages.append(f"FAILURE: listing {channel_name} failed with exception {e}")
+        return channel_id, None, messages
+
+def iter_channel_listings_concurrently(
+    channel_names: list,
+    max_workers: int = default_channel_workers,
+    cookies: str = "",
+    incremental: bool = True,
+    filters: ChannelFilters = None,
+):
+    """
+    Resolves and lists channels on a pool of max_workers threads (requests are
+    still paced by the shared rate limiter) and yields
+    (channel_name, channel_id, videos, messages) as each one completes.
+    videos is a list of ChannelVideo, or None if the channel could not be
+    found or listed; one failing channel does not stop the others. Pending
+    listings are cancelled if the caller stops iterating. filters apply to
+    each channel (see iter_channel_videos).
+    """
+    executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="channel-list")
+    try:
+        futures = {
+            executor.submit(_list_channel_in_worker, name, cookies, incremental, filters): name for name in channel_names
+        }
+        for future in as_completed(futures):
+            channel_id, videos, messages = future.result()
+            yield futures[future], channel_id, videos, messages
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def get_channel_videos(
+    channel_name: str, cookies: str = "", log=print, incremental: bool = True, filters: ChannelFilters = None
+) -> Tuple[list, list, list] | Tuple[None, None, None]:
+    """
+    Lists a channel's videos (see iter_channel_videos for incremental and
+    filters); progress and errors go to log (print, or st.write from the UI).
+    """
     try:
-        st.write("INFO: starting channel video id puller...")
-        channel_id = get_channel_id_from_name(channel_name)
+        log("INFO: starting channel video id puller...")
+        channel_id = get_channel_id_from_name(channel_name, cookies, log)
         if channel_id is not None:
-            video_ids, video_urls, video_titles = get_videourl_from_channel_id(channel_id)
+            video_ids, video_urls, video_titles = get_videourl_from_channel_id(channel_id, log, incremental, filters)
             if video_ids is not None and video_urls is not None and video_titles is not None:
-                st.write("...done!")
+                log("...done!")
                 return video_ids, video_urls, video_titles
             else:
-                st.write("...done!")
+                log("...done!")
                 return None, None, None
         else:
-            st.write("...done!")
+            log("...done!")
             return None, None, None
     except Exception as e:
-        st.write(f"FAILURE: get_channel_videos failed with exception {e}")
+        log(f"FAILURE: get_channel_videos failed with exception {e}")
         return None, None, None
@@ -0,0 +1,138 @@
+import csv
+import io
+import itertools
+import json
+import os
+import tempfile
+import pyarrow as pa
+import pyarrow.parquet as pq
+from metadata import video_url
+from persistence import iter_transcripts
+from subtitles import segments_text
+
+# Bulk exporters shared by the transcript and channel pages. Rows are dicts
+# consumed a batch at a time and written straight to a file, so exporting
+# the whole store never builds a DataFrame or one big string in memory.
+EXPORT_DIR = "data/exports"
+EXPORT_BATCH_ROWS = 1000
+TRANSCRIPT_COLUMNS = ["channel", "video_id", "youtube_url", "video_title", "transcript"]
+CHANNEL_COLUMNS = ["youtube_url", "video_id", "video_title"]
+CHANNEL_BATCH_COLUMNS = ["channel"] + CHANNEL_COLUMNS
+
+def transcript_rows():
+    """Yields every stored transcript as an export row."""
+    for channel, video_id, title, text in iter_transcripts():
+        yield {
+            "channel": channel,
+            "video_id": video_id,
+            "youtube_url": video_url(video_id),
+            "video_title": title,
+            "transcript": text,
+        }
+
+def frame_rows(df, batch_rows: int = EXPORT_BATCH_ROWS):
+    """Yields the rows of a DataFrame as dicts, converting one slice at a time."""
+    for start in range(0, len(df), batch_rows):
+        yield from df.iloc[start:start + batch_rows].to_dict("records")
+
+def table_rows(table: pa.Table, batch_rows: int = EXPORT_BATCH_ROWS):
+    """Yields the rows of an Arrow table as dicts, converting one record batch at a time."""
+    for record_batch in table.to_batches(max_chunksize=batch_rows):
+        yield from record_batch.to_pylist()
+
+def _batches(rows, batch_rows: int = EXPORT_BATCH_ROWS):
+    if isinstance(rows, pa.Table):
+        rows = table_rows(rows, batch_rows)
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, batch_rows))
+        if not batch:
+            return
+        yield batch
+
+def _text(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, list):
+        return segments_text(value)
+    return str(value)
+
+def format_txt_record(row: dict) -> str:
+    return (
+        f"{row.get('video_title', 'Unknown Title')}\n{row.get('youtube_url', 'Unknown URL')}\n"
+        f"-------------------\n{_text(row.get('transcript', ''))}\n\n"
+    )
+
+def write_txt(rows, out, columns=None) -> None:
+    for batch in _batches(rows):
+        out.write("".join(map(format_txt_record, batch)).encode("utf-8"))
+
+def write_csv(rows, out, columns) -> None:
+    text = io.TextIOWrapper(out, encoding="utf-8", newline="")
+    writer = csv.writer(text)
+    writer.writerow(columns)
+    for batch in _batches(rows):
+        writer.writerows([_text(row.get(column)) for column in columns] for row in batch)
+    text.flush()
+    text.detach()
+
+def write_jsonl(rows, out, columns) -> None:
+    for batch in _batches(rows):
+        out.write("".join(
+            json.dumps({column: _text(row.get(column)) for column in columns}, ensure_ascii=False) + "\n"
+            for row in batch
+        ).encode("utf-8"))
+
+def _record_batches(rows, columns):
+    schema = pa.schema([(column, pa.string()) for column in columns])
+    if isinstance(rows, pa.Table):
+        # Already columnar: no conversion through Python objects
+        yield from rows.select(columns).cast(schema).to_batches(max_chunksize=EXPORT_BATCH_ROWS)
+        return
+    for batch in _batches(rows):
+        yield pa.RecordBatch.from_pydict(
+            {column: [_text(row.get(column)) for row in batch] for column in columns},
+            schema=schema,
+        )
+
+def write_parquet(rows, out, columns) -> None:
+    schema = pa.schema([(column, pa.string()) for column in columns])
+    with pq.ParquetWriter(out, schema, compression="zstd") as writer:
+        for record_batch in _record_batches(rows, columns):
+            writer.write_batch(record_batch)
+
+def write_arrow(rows, out, columns) -> None:
+    schema = pa.schema([(column, pa.string()) for column in columns])
+    with pa.ipc.new_file(out, schema) as writer:
+        for record_batch in _record_batches(rows, columns):
+            writer.write_batch(record_batch)
+
+# name: (file extension, MIME type, writer)
+EXPORT_FORMATS = {
+    "TXT": ("txt", "text/plain", write_txt),
+    "CSV": ("csv", "text/csv", write_csv),
+    "JSONL": ("jsonl", "application/jsonl", write_jsonl),
+    "Parquet": ("parquet", "application/vnd.apache.parquet", write_parquet),
+    "Arrow": ("arrow", "application/vnd.apache.arrow.file", write_arrow),
+}
+
+def export_file(rows, export_format: str, columns: list):
+    """
+    Writes rows (dicts, or an Arrow table) in export_format to a file under
+    EXPORT_DIR and returns it opened for reading (what st.download_button
+    accepts). The file is unlinked right away, so it disappears once the
+    reader is closed.
+    """
+    _, _, writer = EXPORT_FORMATS[export_format]
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=EXPORT_DIR, suffix=".export.tmp")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            writer(rows, out, columns)
+        return open(path, "rb")
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            # Windows cannot remove an open file; it stays in EXPORT_DIR.
+            pass
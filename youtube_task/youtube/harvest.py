@@ -0,0 +1,241 @@
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from collections import Counter
+from contextlib import redirect_stdout
+from transcript_downloader.config import default_max_workers, default_missing_transcript_ttl_hours
+from transcript_downloader.yt_transcript_download import iter_transcripts_concurrently
+from transcript_downloader.pipeline import known_video_ids, plan_fetches, store_transcript_entry
+from channel_downloader.yt_channel_download import get_channel_videos
+from metadata import canonical_video_id
+from persistence import (
+    load_transcript_index,
+    load_missing_transcripts,
+    get_state_value,
+    flush_persistent_state,
+)
+
+# Headless transcript harvesting for scheduled jobs, without Streamlit:
+#
+#   python harvest.py --urls data/input/test_input.txt --channel "Steve Kaufmann"
+#   python harvest.py --resume data/harvest/harvest-20260101-020000.jsonl
+#
+# Run it from this directory, like the app, so both use the same data/ store.
+# Progress goes to stdout as one JSON object per line, everything else to
+# stderr. The job (its sources, their resolved URL lists and every result) is
+# appended to a JSON-lines manifest, so an interrupted job can be resumed.
+HARVEST_DIR = "data/harvest"
+# Results that are not retried when a job is resumed ("failed" ones are).
+FINAL_STATUSES = {"saved", "skipped", "missing", "invalid"}
+URL_SEPARATOR_PATTERN = re.compile(r"[\s,]+")
+
+def read_url_file(path: str) -> list:
+    """URLs from a text file, separated by commas and/or whitespace (repeats dropped)."""
+    with open(path, "r", encoding="utf-8") as f:
+        return list(dict.fromkeys(url for url in URL_SEPARATOR_PATTERN.split(f.read()) if url))
+
+def source_key(source: dict) -> str:
+    return f"{source['type']}:{source['path'] if source['type'] == 'urls' else source['name']}"
+
+def source_channel(source: dict) -> str:
+    # The channel transcripts are stored under, as the UI does for uploaded files.
+    if source["type"] == "urls":
+        return os.path.splitext(os.path.basename(source["path"]))[0]
+    return source["name"]
+
+def resolve_source(source: dict, cookies: str, log) -> list | None:
+    """The source's video URLs (None if a channel listing fails)."""
+    if source["type"] == "urls":
+        return read_url_file(source["path"])
+    _, video_urls, _ = get_channel_videos(source["name"], cookies, log=log)
+    return video_urls
+
+def load_manifest(path: str) -> tuple:
+    """Returns (job, {source key: source record}, {(channel, url): result record})."""
+    job, sources, results = None, {}, {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut short by a crash; whatever it recorded is redone.
+                continue
+            if record["type"] == "job":
+                job = record
+            elif record["type"] == "source":
+                sources[record["source"]] = record
+            elif record["type"] == "result":
+                results[(record["channel"], record["url"])] = record
+    if job is None:
+        raise ValueError(f"{path} is not a harvest manifest")
+    return job, sources, results
+
+def _ends_with_newline(path: str) -> bool:
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Fetch transcripts into the store without the Streamlit app.")
+    parser.add_argument("--urls", action="append", default=[], metavar="FILE",
+                        help="text file of video URLs; stored under the file's name (repeatable)")
+    parser.add_argument("--channel", action="append", default=[], metavar="NAME",
+                        help="YouTube channel (name, @handle or channel URL) whose videos are harvested; "
+                             "stored under NAME (repeatable)")
+    parser.add_argument("--resume", metavar="MANIFEST", help="continue the job recorded in MANIFEST")
+    parser.add_argument("--manifest", metavar="PATH", help=f"manifest for a new job (default: under {HARVEST_DIR})")
+    parser.add_argument("--workers", type=int, help=f"transcripts fetched in parallel (default {default_max_workers})")
+    parser.add_argument("--missing-ttl-hours", type=float,
+                        help="skip videos found without a transcript this recently "
+                             f"(default {default_missing_transcript_ttl_hours})")
+    parser.add_argument("--recheck-missing", action="store_true",
+                        help="also retry videos recently found without a transcript")
+    parser.add_argument("--cookies", metavar="FILE",
+                        help="Netscape cookie file (default: the cookies saved in the app)")
+    args = parser.parse_args(argv)
+    if args.resume and (args.urls or args.channel or args.manifest):
+        parser.error("--resume takes its sources from the manifest")
+    if not args.resume and not (args.urls or args.channel):
+        parser.error("give --urls and/or --channel, or --resume a job")
+    return args
+
+def harvest(args, emit, log) -> int:
+    """Runs (or resumes) a harvest job; returns the process exit code."""
+    if args.resume:
+        manifest_path = args.resume
+        job, sources, results = load_manifest(manifest_path)
+    else:
+        manifest_path = args.manifest or os.path.join(HARVEST_DIR, time.strftime("harvest-%Y%m%d-%H%M%S.jsonl"))
+        job = {
+            "type": "job",
+            "created_at": time.time(),
+            "sources": [{"type": "urls", "path": os.path.abspath(path)} for path in args.urls]
+                       + [{"type": "channel", "name": name} for name in args.channel],
+            "workers": args.workers or default_max_workers,
+            "missing_ttl_hours": (default_missing_transcript_ttl_hours if args.missing_ttl_hours is None
+                                  else args.missing_ttl_hours),
+            "recheck_missing": args.recheck_missing,
+        }
+        sources, results = {}, {}
+    workers = args.workers or job["workers"]
+    missing_ttl_hours = job["missing_ttl_hours"] if args.missing_ttl_hours is None else args.missing_ttl_hours
+    recheck_missing = args.recheck_missing or job["recheck_missing"]
+    if args.cookies:
+        with open(args.cookies, "r", encoding="utf-8") as f:
+            cookies = f.read()
+    else:
+        cookies = get_state_value("youtube_cookies", "")
+
+    if os.path.dirname(manifest_path):
+        os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    started = time.time()
+    counts = Counter()
+    with open(manifest_path, "a", encoding="utf-8") as manifest:
+        def record(entry: dict) -> None:
+            manifest.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            manifest.flush()
+
+        if args.resume:
+            # Finish a line cut short by a crash so new records start on their own line.
+            if manifest.tell() and not _ends_with_newline(manifest_path):
+                manifest.write("\n")
+        else:
+            record(job)
+        emit({"type": "job", "manifest": manifest_path, "resumed": bool(args.resume)})
+
+        # 1) Resolve every source to its URL list once; listings are kept in the manifest.
+        for source in job["sources"]:
+            key = source_key(source)
+            if key in sources:
+                continue
+            urls = resolve_source(source, cookies, log)
+            if urls is None:
+                counts["source_failed"] += 1
+                emit({"type": "source", "source": key, "status": "failed"})
+                continue
+            sources[key] = {"type": "source", "source": key, "channel": source_channel(source), "urls": urls}
+            record(sources[key])
+            emit({"type": "source", "source": key, "status": "resolved", "urls": len(urls)})
+
+        # 2) Work left over: no final result yet, or "saved" but lost from the store
+        # (the process died before the write batch was committed).
+        transcript_index = load_transcript_index()
+        pending = []
+        for source in sources.values():
+            stored = transcript_index.get(source["channel"], {})
+            urls = []
+            for url in source["urls"]:
+                result = results.get((source["channel"], url))
+                if result and result["status"] in FINAL_STATUSES:
+                    if result["status"] != "saved" or result.get("video_id") in stored:
+                        continue
+                urls.append(url)
+            pending.append((source["channel"], urls))
+        total = sum(len(urls) for _, urls in pending)
+        done = 0
+
+        def finish(entry: dict) -> None:
+            nonlocal done
+            done += 1
+            counts[entry["status"]] += 1
+            record(entry)
+            emit({**entry, "done": done, "total": total})
+
+        def summary(interrupted: bool) -> dict:
+            return {"type": "summary", "manifest": manifest_path, "interrupted": interrupted,
+                    "counts": dict(counts), "elapsed": round(time.time() - started, 1)}
+
+        # 3) Fetch per channel; skips and results are recorded as they happen.
+        missing_ids = {} if recheck_missing else load_missing_transcripts(missing_ttl_hours * 3600)
+        try:
+            for channel, urls in pending:
+                known_ids = known_video_ids(transcript_index.get(channel, {}))
+                original_urls = {}
+                for url, fetch_url, skip_reason in plan_fetches(urls, known_ids, missing_ids):
+                    if fetch_url:
+                        original_urls[fetch_url] = url
+                        continue
+                    finish({"type": "result", "channel": channel, "url": url,
+                            "video_id": canonical_video_id(url), "status": "skipped", "reason": skip_reason})
+                fetched = iter_transcripts_concurrently(list(original_urls), workers, cookies)
+                for fetch_url, transcript_entry, messages in fetched:
+                    for message in messages:
+                        log(message)
+                    status, _ = store_transcript_entry(channel, fetch_url, transcript_entry)
+                    result = {"type": "result", "channel": channel, "url": original_urls[fetch_url],
+                              "video_id": transcript_entry.get("video_id"), "status": status,
+                              "title": transcript_entry.get("video_title")}
+                    if status == "missing":
+                        result["reason"] = transcript_entry["missing_reason"]
+                    finish(result)
+        except KeyboardInterrupt:
+            flush_persistent_state()
+            emit(summary(interrupted=True))
+            return 130
+        # Commit whatever is left in the current journal batch
+        flush_persistent_state()
+        record(summary(interrupted=False))
+        emit(summary(interrupted=False))
+    # Non-zero when something should be retried (run again with --resume).
+    return 1 if counts["failed"] or counts["source_failed"] else 0
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    progress = sys.stdout
+
+    def emit(entry: dict) -> None:
+        progress.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        progress.flush()
+
+    def log(message) -> None:
+        print(message, file=sys.stderr, flush=True)
+
+    # Keep stdout machine-readable: the modules' own DEBUG/INFO prints go to stderr.
+    with redirect_stdout(sys.stderr):
+        return harvest(args, emit, log)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+import glob
+import hashlib
+import os
+import threading
+from contextlib import contextmanager
+from persistence import get_media_file, record_media_file, forget_media_file
+from storage import MEDIA, track_file, in_use
+
+# Managed cache of downloaded videos, keyed by (video_id, yt-dlp format
+# selector). Each entry has its own folder, MEDIA_DIR/<video_id>/<format key>/,
+# holding <title>.mp4; the store records the finished file's size and SHA-256,
+# so a repeat request is answered from disk without any network call. An
+# interrupted download leaves yt-dlp's <title>.mp4.part in the folder, and the
+# next download of the entry continues it instead of starting over. The
+# files count towards the media quota of storage.py, which evicts the least
+# recently used ones.
+MEDIA_DIR = "data/media"
+PARTIAL_SUFFIX = ".part"
+READ_CHUNK_SIZE = 1024 * 1024
+
+# One download per entry at a time within this process.
+_entry_locks = {}
+_entry_locks_lock = threading.Lock()
+
+def format_key(format_selector: str) -> str:
+    """Folder name for a format selector (selectors contain characters like [ and <)."""
+    return hashlib.sha256(format_selector.encode("utf-8")).hexdigest()[:16]
+
+def media_dir(video_id: str, format_selector: str) -> str:
+    return os.path.join(MEDIA_DIR, video_id, format_key(format_selector))
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(READ_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+@contextmanager
+def media_entry_lock(video_id: str, format_selector: str):
+    """Held while an entry is looked up and downloaded, so concurrent requests download it once."""
+    with _entry_locks_lock:
+        lock = _entry_locks.setdefault((video_id, format_selector), threading.Lock())
+    with lock:
+        yield
+
+def _entry_files(video_id: str, format_selector: str, pattern: str) -> list:
+    return sorted(glob.glob(os.path.join(glob.escape(media_dir(video_id, format_selector)), pattern)))
+
+def _record_media(video_id: str, format_selector: str, path: str) -> None:
+    record_media_file(video_id, format_selector, path, os.path.getsize(path), file_sha256(path))
+
+def add_media(video_id: str, format_selector: str, path: str) -> str:
+    """Records a finished download (size and checksum) and returns its path."""
+    _record_media(video_id, format_selector, path)
+    track_file(MEDIA, path, hit=False)
+    return path
+
+def cached_media(video_id: str, format_selector: str) -> str | None:
+    """
+    Returns the path of the cached file for the entry, or None. A record whose
+    file is gone or has changed size is dropped (with the file); a finished
+    file without a record (the process stopped before writing it) is recorded
+    and used.
+    """
+    row = get_media_file(video_id, format_selector)
+    if row is not None:
+        path, size, _ = row
+        # Not evicted between the check and the access being recorded
+        with in_use(path):
+            if os.path.isfile(path):
+                if os.path.getsize(path) == size:
+                    track_file(MEDIA, path, hit=True)
+                    return path
+                os.remove(path)
+        forget_media_file(video_id, format_selector)
+    # yt-dlp only renames <title>.mp4.part to <title>.mp4 once it is complete.
+    finished = _entry_files(video_id, format_selector, "*.mp4")
+    if not finished:
+        return None
+    _record_media(video_id, format_selector, finished[0])
+    track_file(MEDIA, finished[0], hit=True)
+    return finished[0]
+
+def partial_media(video_id: str, format_selector: str) -> str | None:
+    """The target path of an interrupted download of the entry (to be resumed), or None."""
+    partial = _entry_files(video_id, format_selector, "*.mp4" + PARTIAL_SUFFIX)
+    return partial[0][: -len(PARTIAL_SUFFIX)] if partial else None
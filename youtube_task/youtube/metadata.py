@@ -0,0 +1,116 @@
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import yt_dlp
+from persistence import get_cached_video_info, cache_video_info
+from rate_limit import rate_limited, YOUTUBE_HOST
+from subtitles import SUPPORTED_FORMATS
+
+# One yt-dlp extraction per video feeds the title lookup, subtitle selection and
+# the download itself. Results are cached on disk (in the state database) keyed
+# by video_id. The media and caption URLs inside expire after roughly six hours,
+# so the TTL stays below that.
+VIDEO_INFO_TTL_SECONDS = 3 * 60 * 60
+
+# Every URL form YouTube uses for a single video, reduced to its 11-character ID.
+VIDEO_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{11}$")
+VIDEO_URL_PATTERN = re.compile(
+    r"^(?:https?://)?(?:(?:www|m|music)\.)?"
+    r"(?:youtube\.com/(?:watch\?(?:.*&)?v=|shorts/|embed/|live/|v/)|youtu\.be/)"
+    r"([A-Za-z0-9_-]{11})(?:[?&#/].*)?$"
+)
+
+_cookie_files = {}
+_cookie_files_lock = threading.Lock()
+
+def video_url(video_id: str) -> str:
+    return f"https://www.youtube.com/watch?v={video_id}"
+
+def canonical_video_id(url: str) -> str | None:
+    """
+    Returns the video ID for any single-video URL form (watch?v=, shorts/,
+    youtu.be/, embed/, live/, extra query parameters, surrounding whitespace)
+    or a bare ID. Returns None if no video ID can be found.
+    """
+    if not isinstance(url, str):
+        return None
+    url = url.strip()
+    if VIDEO_ID_PATTERN.match(url):
+        return url
+    match = VIDEO_URL_PATTERN.match(url)
+    return match.group(1) if match else None
+
+def cookiefile_for(cookies: str) -> str | None:
+    """Returns a Netscape cookie file for cookies, written once per distinct cookie string."""
+    cookies = (cookies or "").strip()
+    if not cookies:
+        return None
+    key = hashlib.sha256(cookies.encode("utf-8")).hexdigest()
+    with _cookie_files_lock:
+        path = _cookie_files.get(key)
+        if path and os.path.exists(path):
+            return path
+        cookie_file = tempfile.NamedTemporaryFile(delete=False, suffix=".txt")
+        cookie_file.write(cookies.encode("utf-8"))
+        cookie_file.close()
+        _cookie_files[key] = cookie_file.name
+        print("DEBUG: Wrote cookie file:", cookie_file.name)
+        return cookie_file.name
+
+def extract_video_info(video_id: str, cookies: str = "", refresh: bool = False) -> dict:
+    """
+    Returns yt-dlp's info dict for a video, from the on-disk cache when it is
+    younger than VIDEO_INFO_TTL_SECONDS. Pass refresh=True to force a new
+    extraction. Raises whatever yt-dlp raises if the extraction fails.
+    """
+    if not refresh:
+        info = get_cached_video_info(video_id, VIDEO_INFO_TTL_SECONDS)
+        if info is not None:
+            return info
+    ydl_opts = {
+        "quiet": True,
+        "skip_download": True,
+    }
+    cookiefile = cookiefile_for(cookies)
+    if cookiefile:
+        ydl_opts["cookiefile"] = cookiefile
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl, rate_limited(YOUTUBE_HOST):
+        # Without the private keys: requested_formats/requested_downloads hold
+        # the default format selection, which download_from_info would reuse.
+        info = ydl.sanitize_info(ydl.extract_info(video_url(video_id), download=False), remove_private_keys=True)
+    cache_video_info(video_id, info, VIDEO_INFO_TTL_SECONDS)
+    return info
+
+def _subtitle_format_url(formats: list) -> str | None:
+    urls = {f.get("ext"): f["url"] for f in formats if f.get("url")}
+    for ext in SUPPORTED_FORMATS:
+        if ext in urls:
+            return urls[ext]
+    return None
+
+def select_subtitle_url(info: dict) -> str | None:
+    """
+    Picks English manual subtitles, then English auto captions, then any
+    language, in a format subtitles.py can parse (json3, vtt or srt).
+    """
+    subtitles = info.get("subtitles") or {}
+    automatic_captions = info.get("automatic_captions") or {}
+    candidates = [subtitles.get('en'), automatic_captions.get('en')]
+    candidates += list(subtitles.values()) + list(automatic_captions.values())
+    for formats in candidates:
+        url = _subtitle_format_url(formats or [])
+        if url:
+            return url
+    return None
+
+def download_from_info(info: dict, ydl_opts: dict) -> None:
+    """
+    Downloads the video described by an extracted info dict without extracting
+    it again. Formats are selected afresh with ydl_opts["format"]; a selection
+    left in the dict (e.g. by an older cache entry) is dropped.
+    """
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl, rate_limited(YOUTUBE_HOST):
+        # sanitize_info returns a new dict, so the caller's info is left as it is.
+        ydl.process_ie_result(ydl.sanitize_info(dict(info), remove_private_keys=True), download=True)
@@ -1,37 +1,892 @@
+import atexit
+import hashlib
 import json
 import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from blobs import put_blob, read_blob, delete_blob, collect_garbage
+from subtitles import SEGMENT_TABLE_MAGIC, SegmentTable, encode_segments, decode_segments, segments_share_text
 
-# This file will store persistent state (transcripts grouped by channel, progress, etc.)
+# Legacy single-file store; only read once to migrate into the database below.
 PERSISTENCE_FILE = "data/state.json"
+# SQLite store holding transcripts grouped by channel, progress, cookies, etc.
+# Transcript bodies and their timed segments live in the blob store (blobs.py);
+# rows only hold their hashes. Segments are a subtitles.SegmentTable whose text
+# is normally the body itself, so the segments blob carries only the timing.
+DATABASE_FILE = "data/state.db"
 
-def load_persistent_state():
-    print("DEBUG: Looking for persistence file at:", os.path.abspath(PERSISTENCE_FILE))
-    if os.path.exists(PERSISTENCE_FILE):
-        with open(PERSISTENCE_FILE, "r") as f:
-            return json.load(f)
+# Mutations are queued in memory and written to the SQLite write-ahead log in
+# one short transaction (fsync'd) per batch: whichever of these limits is
+# reached first closes the batch. A crash loses at most the open batch. A read
+# only commits the open batch early when the batch holds a write to what it
+# reads, so lookups of other records (e.g. from fetch workers) do not cut
+# batches short.
+JOURNAL_BATCH_SIZE = 50
+JOURNAL_BATCH_SECONDS = 2.0
+# A queued mutation that fails is retried with the next batch; after this many
+# failed attempts it is dropped and its error raised to whoever flushed.
+JOURNAL_MAX_ATTEMPTS = 3
+# Every this many committed batches the log is folded back into the database.
+JOURNAL_COMPACT_EVERY = 100
+# Several processes (Streamlit servers, workers) may share the database; a
+# writer waits this long for another process's transaction to finish.
+BUSY_TIMEOUT_SECONDS = 30.0
+
+# Transcript bodies are loaded on demand; this many stay cached per process.
+TRANSCRIPT_CACHE_SIZE = 64
+
+# Full-text index over transcript titles and bodies (rowid = transcripts.rowid).
+# It is contentless, so the text is not stored twice: a row is removed with
+# FTS5's 'delete' command, which needs the old title and body.
+SEARCH_INDEX_SCHEMA = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS transcript_search USING fts5(
+        title, transcript, content='', tokenize='unicode61 remove_diacritics 2'
+    )
+"""
+
+def _index_transcript(conn, rowid, title, transcript):
+    conn.execute(
+        "INSERT INTO transcript_search (rowid, title, transcript) VALUES (?, ?, ?)",
+        (rowid, title, transcript),
+    )
+
+def _unindex_transcript(conn, rowid, title, digest):
+    try:
+        transcript = read_blob(digest).decode("utf-8")
+    except FileNotFoundError:
+        return
+    conn.execute(
+        "INSERT INTO transcript_search (transcript_search, rowid, title, transcript) VALUES ('delete', ?, ?, ?)",
+        (rowid, title, transcript),
+    )
+
+def _move_transcripts_to_blobs(conn: sqlite3.Connection) -> None:
+    # The table is rebuilt without the transcript column rather than using
+    # ALTER TABLE ... DROP COLUMN, which needs SQLite 3.35.
+    conn.execute("""
+        CREATE TABLE transcripts_blobs (
+            channel TEXT NOT NULL,
+            video_id TEXT NOT NULL,
+            title TEXT NOT NULL,
+            blob TEXT NOT NULL DEFAULT '',
+            PRIMARY KEY (channel, video_id)
+        )
+    """)
+    for rowid, channel, video_id, title, transcript in conn.execute(
+        "SELECT rowid, channel, video_id, title, transcript FROM transcripts ORDER BY rowid"
+    ).fetchall():
+        conn.execute(
+            "INSERT INTO transcripts_blobs (rowid, channel, video_id, title, blob) VALUES (?, ?, ?, ?, ?)",
+            (rowid, channel, video_id, title, put_blob(transcript.encode("utf-8"))),
+        )
+    conn.execute("DROP TABLE transcripts")
+    conn.execute("ALTER TABLE transcripts_blobs RENAME TO transcripts")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_transcripts_video_id ON transcripts (video_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_transcripts_blob ON transcripts (blob)")
+
+def _build_search_index(conn: sqlite3.Connection) -> None:
+    conn.execute(SEARCH_INDEX_SCHEMA)
+    for rowid, title, digest in conn.execute("SELECT rowid, title, blob FROM transcripts").fetchall():
+        _index_transcript(conn, rowid, title, read_blob(digest).decode("utf-8"))
+
+def _pack_segments(conn: sqlite3.Connection) -> None:
+    # JSON segment lists from before SegmentTable; the old blobs are collected after the commit.
+    for rowid, digest, segments_digest in conn.execute(
+        "SELECT rowid, blob, segments FROM transcripts WHERE segments != ''"
+    ).fetchall():
+        data = read_blob(segments_digest)
+        if data.startswith(SEGMENT_TABLE_MAGIC):
+            continue
+        packed = put_blob(encode_segments(decode_segments(data), read_blob(digest)))
+        conn.execute("UPDATE transcripts SET segments = ? WHERE rowid = ?", (packed, rowid))
+
+# Each entry upgrades the schema by one version (tracked in PRAGMA user_version).
+# Entries are SQL scripts, or callables for migrations that also move data.
+SCHEMA_MIGRATIONS = [
+    """
+    CREATE TABLE IF NOT EXISTS transcripts (
+        channel TEXT NOT NULL,
+        video_id TEXT NOT NULL,
+        title TEXT NOT NULL,
+        transcript TEXT NOT NULL,
+        PRIMARY KEY (channel, video_id)
+    );
+    CREATE INDEX IF NOT EXISTS idx_transcripts_video_id ON transcripts (video_id);
+    CREATE TABLE IF NOT EXISTS downloaded_links (
+        url TEXT PRIMARY KEY
+    );
+    CREATE TABLE IF NOT EXISTS failed_downloads (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        url TEXT NOT NULL,
+        error TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_failed_downloads_url ON failed_downloads (url);
+    CREATE TABLE IF NOT EXISTS settings (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    );
+    """,
+    _move_transcripts_to_blobs,
+    """
+    CREATE TABLE IF NOT EXISTS video_info (
+        video_id TEXT PRIMARY KEY,
+        fetched_at REAL NOT NULL,
+        info BLOB NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_video_info_fetched_at ON video_info (fetched_at);
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS missing_transcripts (
+        video_id TEXT PRIMARY KEY,
+        reason TEXT NOT NULL,
+        checked_at REAL NOT NULL
+    );
+    """,
+    """
+    ALTER TABLE transcripts ADD COLUMN segments TEXT NOT NULL DEFAULT '';
+    CREATE INDEX IF NOT EXISTS idx_transcripts_segments ON transcripts (segments);
+    """,
+    _build_search_index,
+    _pack_segments,
+    """
+    CREATE TABLE IF NOT EXISTS channel_listings (
+        channel_id TEXT PRIMARY KEY,
+        newest_video_id TEXT NOT NULL,
+        listed_at REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS channel_videos (
+        channel_id TEXT NOT NULL,
+        video_id TEXT NOT NULL,
+        title TEXT NOT NULL,
+        position INTEGER NOT NULL,
+        PRIMARY KEY (channel_id, video_id)
+    );
+    CREATE INDEX IF NOT EXISTS idx_channel_videos_position ON channel_videos (channel_id, position);
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS channel_names (
+        name TEXT PRIMARY KEY,
+        channel_id TEXT NOT NULL,
+        resolved_at REAL NOT NULL
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS media_files (
+        video_id TEXT NOT NULL,
+        format TEXT NOT NULL,
+        path TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        sha256 TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        PRIMARY KEY (video_id, format)
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS stored_files (
+        path TEXT PRIMARY KEY,
+        kind TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        accessed_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_stored_files_lru ON stored_files (kind, accessed_at);
+    INSERT OR IGNORE INTO stored_files (path, kind, size, accessed_at)
+        SELECT path, 'media', size, created_at FROM media_files;
+    """,
+]
+
+# One connection per process, shared by all Streamlit sessions/threads.
+# Every write happens inside BEGIN IMMEDIATE, i.e. under SQLite's cross-process
+# write lock, and touches single records, so concurrent writers merge instead of
+# overwriting each other. Blob files are created and garbage-collected only while
+# that lock is held, so a blob can never be deleted while another process is
+# about to reference it.
+_lock = threading.RLock()
+_conn = None
+_conn_path = None
+# "ops" holds (op, touches, failed attempts); "touched" holds (table, key) for
+# every queued op: key None for a whole table, (None, None) for an op that may
+# write anything.
+_journal = {"ops": [], "touched": set(), "opened_at": 0.0, "commits": 0, "orphans": set()}
+_transcript_cache = OrderedDict()
+
+def default_state() -> dict:
+    return {
+        "transcripts": {},  # structure: {channel: {video_id: {"title": ..., "transcript": ...}}}
+        "download_progress": {"downloaded": 0, "total": 0},
+        "failed_downloads": [],
+        "downloaded_links": [],
+    }
+
+@contextmanager
+def _write_transaction(conn: sqlite3.Connection):
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+def _migrate_schema(conn: sqlite3.Connection) -> None:
+    moved_data = False
+    # Re-read the version under the write lock: another process may have migrated meanwhile.
+    with _write_transaction(conn):
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for target, step in enumerate(SCHEMA_MIGRATIONS[version:], start=version + 1):
+            if callable(step):
+                step(conn)
+                moved_data = True
+            else:
+                for statement in step.split(";"):
+                    if statement.strip():
+                        conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {target}")
+    if moved_data:
+        # Drop blobs the migrated rows no longer reference, and give back the
+        # pages freed by data moved out of the database.
+        with _write_transaction(conn):
+            collect_garbage(_referenced_blobs(conn))
+        conn.execute("VACUUM")
+
+def get_connection() -> sqlite3.Connection:
+    """
+    Returns the process-wide connection to DATABASE_FILE, creating the schema and
+    importing the legacy JSON state the first time the database is opened.
+    Opening the database replays any committed write-ahead log left by a crash.
+    """
+    global _conn, _conn_path
+    with _lock:
+        if _conn is not None and _conn_path == DATABASE_FILE:
+            return _conn
+        if _conn is not None:
+            flush_persistent_state()
+            _conn.close()
+        target_dir = os.path.dirname(DATABASE_FILE)
+        if target_dir:
+            os.makedirs(target_dir, exist_ok=True)
+        conn = sqlite3.connect(
+            DATABASE_FILE,
+            timeout=BUSY_TIMEOUT_SECONDS,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = FULL")
+        _migrate_schema(conn)
+        _conn, _conn_path = conn, DATABASE_FILE
+        _journal.update(ops=[], touched=set(), opened_at=0.0, commits=0, orphans=set())
+        _transcript_cache.clear()
+        if get_state_value("json_migrated") is None:
+            migrate_json_state(PERSISTENCE_FILE)
+        return conn
+
+def _mutation(op, durable: bool = False, touches=None) -> None:
+    """
+    Queues op(conn) in the open journal batch. Each op runs in its own savepoint,
+    so a failing op does not discard the rest of the batch; it stays queued and
+    is retried (see JOURNAL_MAX_ATTEMPTS). With durable=True the op is committed
+    before returning and its errors propagate.
+    touches lists the (table, key) records the op writes (key None for any row
+    of the table); without it, any read commits the batch first.
+    """
+    with _lock:
+        conn = get_connection()
+        if durable:
+            flush_persistent_state()
+            with _write_transaction(conn):
+                op(conn)
+            _after_commit(conn)
+            return
+        if not _journal["ops"]:
+            _journal["opened_at"] = time.monotonic()
+        touches = touches or [(None, None)]
+        _journal["ops"].append((op, touches, 0))
+        _journal["touched"].update(touches)
+        batch_age = time.monotonic() - _journal["opened_at"]
+        if len(_journal["ops"]) >= JOURNAL_BATCH_SIZE or batch_age >= JOURNAL_BATCH_SECONDS:
+            flush_persistent_state()
+
+def flush_persistent_state() -> None:
+    """
+    Writes and commits the open journal batch, if any. Ops that fail are kept
+    for the next batch; an op that has failed JOURNAL_MAX_ATTEMPTS times is
+    dropped and its error raised here, after the rest of the batch is committed.
+    """
+    with _lock:
+        if _conn is None or not _journal["ops"]:
+            return
+        ops, _journal["ops"] = _journal["ops"], []
+        failed = []
+        try:
+            with _write_transaction(_conn) as conn:
+                for op, touches, attempts in ops:
+                    conn.execute("SAVEPOINT mutation")
+                    try:
+                        op(conn)
+                    except Exception as e:
+                        conn.execute("ROLLBACK TO mutation")
+                        print(f"WARNING: state mutation failed (attempt {attempts + 1} of {JOURNAL_MAX_ATTEMPTS}):", e)
+                        failed.append((op, touches, attempts + 1, e))
+                    conn.execute("RELEASE mutation")
+        except Exception:
+            # Nothing was committed (e.g. the database stayed locked); keep the batch.
+            _journal["ops"] = ops + _journal["ops"]
+            raise
+        _journal["touched"] = set()
+        retry = [(op, touches, attempts) for op, touches, attempts, _ in failed if attempts < JOURNAL_MAX_ATTEMPTS]
+        if retry:
+            for _, touches, _ in retry:
+                _journal["touched"].update(touches)
+            _journal["ops"] = retry
+            _journal["opened_at"] = time.monotonic()
+        _after_commit(_conn)
+        given_up = [e for _, _, attempts, e in failed if attempts >= JOURNAL_MAX_ATTEMPTS]
+        if given_up:
+            print(f"ERROR: dropped {len(given_up)} state mutation(s) after {JOURNAL_MAX_ATTEMPTS} attempts")
+            raise given_up[0]
+
+def _after_commit(conn: sqlite3.Connection) -> None:
+    _journal["commits"] += 1
+    # Blobs may only be removed once the rows that stopped referencing them are committed.
+    orphans, _journal["orphans"] = _journal["orphans"], set()
+    if orphans:
+        with _write_transaction(conn):
+            for digest in orphans:
+                if not _blob_referenced(conn, digest):
+                    delete_blob(digest)
+    if _journal["commits"] % JOURNAL_COMPACT_EVERY == 0:
+        compact_persistent_state()
+
+def compact_persistent_state() -> None:
+    """
+    Folds the write-ahead log into the database file and truncates the log, so
+    recovery on the next start only has to replay what was written since.
+    """
+    with _lock:
+        flush_persistent_state()
+        if _conn is not None:
+            _conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+def _flush_periodically() -> None:
+    # Closes batches that stay open because no further mutation arrives.
+    while True:
+        time.sleep(JOURNAL_BATCH_SECONDS)
+        with _lock:
+            if _journal["ops"] and time.monotonic() - _journal["opened_at"] >= JOURNAL_BATCH_SECONDS:
+                try:
+                    flush_persistent_state()
+                except Exception as e:
+                    print("WARNING: periodic state flush failed:", e)
+
+threading.Thread(target=_flush_periodically, name="persistence-flush", daemon=True).start()
+atexit.register(flush_persistent_state)
+
+def _pending_write(table: str | None, key) -> bool:
+    touched = _journal["touched"]
+    if not _journal["ops"]:
+        return False
+    if table is None or (None, None) in touched or (table, None) in touched:
+        return True
+    if key is None:
+        return any(touched_table == table for touched_table, _ in touched)
+    return (table, key) in touched
+
+def _reader(table: str | None = None, key=None) -> sqlite3.Connection:
+    """
+    The connection for a read of table (one record if key is given, the whole
+    store if table is None). Reads see this process's queued mutations (and
+    everything other processes committed): the open batch is committed first
+    if it writes to what is read.
+    """
+    with _lock:
+        if _pending_write(table, key):
+            flush_persistent_state()
+        return get_connection()
+
+def migrate_json_state(json_path: str = PERSISTENCE_FILE) -> bool:
+    """
+    One-shot import of the old data/state.json layout into the database.
+    Returns True if a file was imported; later calls (from any process) are no-ops.
+    """
+    imported = []
+
+    def op(conn):
+        if conn.execute("SELECT 1 FROM settings WHERE key = 'json_migrated'").fetchone():
+            return
+        if os.path.exists(json_path):
+            print("DEBUG: Migrating legacy persistence file:", os.path.abspath(json_path))
+            with open(json_path, "r") as f:
+                _write_state(conn, json.load(f))
+            imported.append(True)
+        _set_setting(conn, "json_migrated", bool(imported))
+
+    _mutation(op, durable=True)
+    return bool(imported)
+
+def _set_setting(conn, key, value):
+    conn.execute(
+        "INSERT INTO settings (key, value) VALUES (?, ?) "
+        "ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+        (key, json.dumps(value)),
+    )
+
+def get_state_value(key: str, default=None):
+    with _lock:
+        row = _reader("settings", key).execute("SELECT value FROM settings WHERE key = ?", (key,)).fetchone()
+    return json.loads(row[0]) if row else default
+
+def set_state_value(key: str, value, durable: bool = False) -> None:
+    _mutation(lambda conn: _set_setting(conn, key, value), durable, touches=[("settings", key)])
+
+def save_transcript(channel: str, video_id: str, title: str, transcript: str, segments: list | None = None) -> None:
+    """
+    Upserts a single transcript without touching the rest of the store.
+    segments (a list of subtitles.Segment) are stored alongside the text;
+    when omitted (e.g. a manual edit) the stored segments are kept.
+    """
+    with _lock:
+        _transcript_cache.pop((channel, video_id), None)
+        _mutation(
+            lambda conn: _upsert_transcript(conn, channel, video_id, title, transcript, segments),
+            touches=[("transcripts", (channel, video_id)), ("missing_transcripts", video_id)],
+        )
+
+def load_transcript_index() -> dict:
+    """Returns {channel: {video_id: title}} without reading any transcript text."""
+    index = {}
+    with _lock:
+        rows = _reader("transcripts").execute(
+            "SELECT channel, video_id, title FROM transcripts ORDER BY rowid"
+        ).fetchall()
+    for channel, video_id, title in rows:
+        index.setdefault(channel, {})[video_id] = title
+    return index
+
+def get_transcript(channel: str, video_id: str) -> str | None:
+    """Loads one transcript body, keeping the most recently used ones cached."""
+    key = (channel, video_id)
+    with _lock:
+        if key in _transcript_cache:
+            _transcript_cache.move_to_end(key)
+            return _transcript_cache[key]
+        for attempt in range(2):
+            row = _reader("transcripts", key).execute(
+                "SELECT blob FROM transcripts WHERE channel = ? AND video_id = ?", key
+            ).fetchone()
+            if row is None:
+                return None
+            try:
+                transcript = read_blob(row[0]).decode("utf-8")
+                break
+            except FileNotFoundError:
+                # Another process replaced or deleted the transcript after the
+                # row was read and collected its blob; the row shows which.
+                if attempt:
+                    return None
+        _transcript_cache[key] = transcript
+        while len(_transcript_cache) > TRANSCRIPT_CACHE_SIZE:
+            _transcript_cache.popitem(last=False)
+        return transcript
+
+def get_transcript_segments(channel: str, video_id: str) -> SegmentTable:
+    """
+    Returns the timed segments of one transcript as a SegmentTable (empty if
+    none were stored); use .between(start, end) for a time range.
+    """
+    for attempt in range(2):
+        with _lock:
+            row = _reader("transcripts", (channel, video_id)).execute(
+                "SELECT segments, blob FROM transcripts WHERE channel = ? AND video_id = ?", (channel, video_id)
+            ).fetchone()
+        if not row or not row[0]:
+            return SegmentTable.from_segments([])
+        try:
+            data = read_blob(row[0])
+            # Usually only the timing is in the segments blob; the text is the transcript body.
+            return decode_segments(data, read_blob(row[1]) if segments_share_text(data) else None)
+        except FileNotFoundError:
+            # Collected by another process after the row was read (see get_transcript).
+            if attempt:
+                return SegmentTable.from_segments([])
+
+def search_transcript_index(match: str, limit: int = 20) -> list:
+    """
+    Runs an FTS5 MATCH query over titles and transcripts and returns up to
+    limit (channel, video_id, title) rows, best match first (bm25, title
+    matches weighted higher).
+    """
+    with _lock:
+        return _reader("transcripts").execute(
+            "SELECT t.channel, t.video_id, t.title FROM transcript_search "
+            "JOIN transcripts AS t ON t.rowid = transcript_search.rowid "
+            "WHERE transcript_search MATCH ? ORDER BY bm25(transcript_search, 5.0, 1.0) LIMIT ?",
+            (match, limit),
+        ).fetchall()
+
+def iter_transcripts(chunk_size: int = 200, channel: str | None = None):
+    """Yields (channel, video_id, title, transcript) rows a chunk at a time, optionally for one channel."""
+    last_rowid = 0
+    while True:
+        with _lock:
+            rows = _reader("transcripts").execute(
+                "SELECT rowid, channel, video_id, title, blob FROM transcripts "
+                "WHERE rowid > ? AND (? IS NULL OR channel = ?) ORDER BY rowid LIMIT ?",
+                (last_rowid, channel, channel, chunk_size),
+            ).fetchall()
+        if not rows:
+            return
+        for _, row_channel, video_id, title, digest in rows:
+            try:
+                transcript = read_blob(digest).decode("utf-8")
+            except FileNotFoundError:
+                # Deleted by another process after this chunk was read.
+                continue
+            yield row_channel, video_id, title, transcript
+        last_rowid = rows[-1][0]
+
+def load_channel_fingerprints() -> dict:
+    """
+    Returns {channel: fingerprint}. A channel's fingerprint changes whenever
+    one of its transcripts is added, removed, renamed or edited.
+    """
+    fingerprints = {}
+    with _lock:
+        rows = _reader("transcripts").execute(
+            "SELECT channel, video_id, title, blob FROM transcripts ORDER BY channel, rowid"
+        )
+        for channel, video_id, title, digest in rows:
+            if channel not in fingerprints:
+                fingerprints[channel] = hashlib.sha256(channel.encode("utf-8"))
+            fingerprints[channel].update(f"\0{video_id}\0{title}\0{digest}".encode("utf-8"))
+    return {channel: h.hexdigest() for channel, h in fingerprints.items()}
+
+def delete_channel(channel: str) -> None:
+    """Removes a channel's transcripts; blobs no other channel uses are deleted."""
+    def op(conn):
+        for rowid, video_id, title, digest, segments in conn.execute(
+            "SELECT rowid, video_id, title, blob, segments FROM transcripts WHERE channel = ?", (channel,)
+        ).fetchall():
+            _unindex_transcript(conn, rowid, title, digest)
+            _journal["orphans"].update(filter(None, (digest, segments)))
+            _transcript_cache.pop((channel, video_id), None)
+        conn.execute("DELETE FROM transcripts WHERE channel = ?", (channel,))
+
+    _mutation(op, durable=True)
+
+def add_downloaded_link(url: str) -> None:
+    _mutation(
+        lambda conn: conn.execute("INSERT OR IGNORE INTO downloaded_links (url) VALUES (?)", (url,)),
+        touches=[("downloaded_links", url)],
+    )
+
+def load_downloaded_links() -> set:
+    """Returns every downloaded link, including those recorded by other sessions."""
+    with _lock:
+        return {url for (url,) in _reader("downloaded_links").execute("SELECT url FROM downloaded_links")}
+
+def record_failed_download(url: str, error: str) -> None:
+    _mutation(
+        lambda conn: conn.execute("INSERT INTO failed_downloads (url, error) VALUES (?, ?)", (url, error)),
+        touches=[("failed_downloads", url)],
+    )
+
+def get_cached_video_info(video_id: str, max_age_seconds: float) -> dict | None:
+    """Returns the cached yt-dlp info dict for video_id if it is younger than max_age_seconds."""
+    with _lock:
+        row = _reader("video_info", video_id).execute(
+            "SELECT fetched_at, info FROM video_info WHERE video_id = ?", (video_id,)
+        ).fetchone()
+    if row is None or time.time() - row[0] > max_age_seconds:
+        return None
+    return json.loads(zlib.decompress(row[1]))
+
+def cache_video_info(video_id: str, info: dict, max_age_seconds: float) -> None:
+    """Stores an info dict (compressed) and drops entries older than max_age_seconds."""
+    data = zlib.compress(json.dumps(info).encode("utf-8"))
+    now = time.time()
+
+    def op(conn):
+        conn.execute(
+            "INSERT INTO video_info (video_id, fetched_at, info) VALUES (?, ?, ?) "
+            "ON CONFLICT (video_id) DO UPDATE SET fetched_at = excluded.fetched_at, info = excluded.info",
+            (video_id, now, data),
+        )
+        conn.execute("DELETE FROM video_info WHERE fetched_at < ?", (now - max_age_seconds,))
+
+    # The expired rows it deletes are ones readers already ignore.
+    _mutation(op, touches=[("video_info", video_id)])
+
+def record_missing_transcript(video_id: str, reason: str) -> None:
+    """Remembers that video_id has no transcript (reason is the failure class name)."""
+    now = time.time()
+    _mutation(lambda conn: conn.execute(
+        "INSERT INTO missing_transcripts (video_id, reason, checked_at) VALUES (?, ?, ?) "
+        "ON CONFLICT (video_id) DO UPDATE SET reason = excluded.reason, checked_at = excluded.checked_at",
+        (video_id, reason, now),
+    ), touches=[("missing_transcripts", video_id)])
+
+def load_missing_transcripts(max_age_seconds: float) -> dict:
+    """Returns {video_id: reason} for videos found without a transcript within max_age_seconds."""
+    with _lock:
+        rows = _reader("missing_transcripts").execute(
+            "SELECT video_id, reason FROM missing_transcripts WHERE checked_at >= ?",
+            (time.time() - max_age_seconds,),
+        ).fetchall()
+    return dict(rows)
+
+def get_cached_channel_id(name: str, max_age_seconds: float, not_found_max_age_seconds: float) -> str | None:
+    """
+    Returns the cached channel ID for a channel name, "" if the name recently
+    found no channel, or None if there is no fresh entry (search again).
+    """
+    with _lock:
+        row = _reader("channel_names", name).execute(
+            "SELECT channel_id, resolved_at FROM channel_names WHERE name = ?", (name,)
+        ).fetchone()
+    if row is None:
+        return None
+    channel_id, resolved_at = row
+    max_age = max_age_seconds if channel_id else not_found_max_age_seconds
+    return channel_id if time.time() - resolved_at <= max_age else None
+
+def cache_channel_id(name: str, channel_id: str) -> None:
+    """Remembers what a channel name resolved to ("" for no channel)."""
+    now = time.time()
+    _mutation(lambda conn: conn.execute(
+        "INSERT INTO channel_names (name, channel_id, resolved_at) VALUES (?, ?, ?) "
+        "ON CONFLICT (name) DO UPDATE SET channel_id = excluded.channel_id, resolved_at = excluded.resolved_at",
+        (name, channel_id, now),
+    ), touches=[("channel_names", name)])
+
+def load_channel_listing(channel_id: str) -> list:
+    """Returns the stored listing of a channel as [(video_id, title), ...], newest first ([] if never listed)."""
+    with _lock:
+        return _reader("channel_videos").execute(
+            "SELECT video_id, title FROM channel_videos WHERE channel_id = ? ORDER BY position DESC",
+            (channel_id,),
+        ).fetchall()
+
+def save_channel_listing(channel_id: str, videos: list, complete: bool) -> None:
+    """
+    Stores videos ([(video_id, title), ...], newest first) for a channel. A
+    complete listing replaces the stored one; otherwise the videos are new
+    uploads and are added in front of it.
+    """
+    def op(conn):
+        if complete:
+            conn.execute("DELETE FROM channel_videos WHERE channel_id = ?", (channel_id,))
+            top = 0
+        else:
+            top = conn.execute(
+                "SELECT COALESCE(MAX(position), 0) FROM channel_videos WHERE channel_id = ?", (channel_id,)
+            ).fetchone()[0]
+        # Positions grow with recency, so new uploads never renumber older rows.
+        conn.executemany(
+            "INSERT OR IGNORE INTO channel_videos (channel_id, video_id, title, position) VALUES (?, ?, ?, ?)",
+            ((channel_id, video_id, title, top + len(videos) - i) for i, (video_id, title) in enumerate(videos)),
+        )
+        newest = conn.execute(
+            "SELECT video_id FROM channel_videos WHERE channel_id = ? ORDER BY position DESC LIMIT 1", (channel_id,)
+        ).fetchone()
+        conn.execute(
+            "INSERT INTO channel_listings (channel_id, newest_video_id, listed_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (channel_id) DO UPDATE SET "
+            "newest_video_id = excluded.newest_video_id, listed_at = excluded.listed_at",
+            (channel_id, newest[0] if newest else "", time.time()),
+        )
+
+    _mutation(op, durable=True)
+
+def get_media_file(video_id: str, format_selector: str) -> tuple | None:
+    """Returns (path, size, sha256) of the cached download of a video in a format, or None."""
+    with _lock:
+        return _reader("media_files", (video_id, format_selector)).execute(
+            "SELECT path, size, sha256 FROM media_files WHERE video_id = ? AND format = ?",
+            (video_id, format_selector),
+        ).fetchone()
+
+def record_media_file(video_id: str, format_selector: str, path: str, size: int, sha256: str) -> None:
+    now = time.time()
+    _mutation(lambda conn: conn.execute(
+        "INSERT INTO media_files (video_id, format, path, size, sha256, created_at) VALUES (?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT (video_id, format) DO UPDATE SET "
+        "path = excluded.path, size = excluded.size, sha256 = excluded.sha256, created_at = excluded.created_at",
+        (video_id, format_selector, path, size, sha256, now),
+    ), touches=[("media_files", (video_id, format_selector))])
+
+def forget_media_file(video_id: str, format_selector: str) -> None:
+    _mutation(lambda conn: conn.execute(
+        "DELETE FROM media_files WHERE video_id = ? AND format = ?", (video_id, format_selector)
+    ), touches=[("media_files", (video_id, format_selector))])
+
+def track_stored_file(kind: str, path: str, size: int) -> None:
+    """Records a file managed by storage.py as used just now (adding it if new)."""
+    now = time.time()
+    _mutation(lambda conn: conn.execute(
+        "INSERT INTO stored_files (path, kind, size, accessed_at) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT (path) DO UPDATE SET kind = excluded.kind, size = excluded.size, accessed_at = excluded.accessed_at",
+        (path, kind, size, now),
+    ), touches=[("stored_files", path)])
+
+def stored_files_usage(kind: str) -> tuple:
+    """Returns (number of files, total bytes) of a kind of stored file."""
+    with _lock:
+        return _reader("stored_files").execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM stored_files WHERE kind = ?", (kind,)
+        ).fetchone()
+
+def load_stored_files_lru(kind: str) -> list:
+    """Returns [(path, size, accessed_at), ...] of a kind of stored file, least recently used first."""
+    with _lock:
+        return _reader("stored_files").execute(
+            "SELECT path, size, accessed_at FROM stored_files WHERE kind = ? ORDER BY accessed_at", (kind,)
+        ).fetchall()
+
+def forget_stored_files(paths: list) -> None:
+    """Drops the records of deleted files, including their media cache entries."""
+    def op(conn):
+        conn.executemany("DELETE FROM stored_files WHERE path = ?", ((path,) for path in paths))
+        conn.executemany("DELETE FROM media_files WHERE path = ?", ((path,) for path in paths))
+
+    _mutation(op, touches=[("stored_files", None), ("media_files", None)])
+
+def _blob_referenced(conn, digest) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM transcripts WHERE blob = ? OR segments = ? LIMIT 1", (digest, digest)
+    ).fetchone() is not None
+
+def _referenced_blobs(conn) -> set:
+    referenced = {digest for (digest,) in conn.execute("SELECT DISTINCT blob FROM transcripts")}
+    referenced.update(digest for (digest,) in conn.execute("SELECT DISTINCT segments FROM transcripts"))
+    return referenced
+
+def _upsert_transcript(conn, channel, video_id, title, transcript, segments=None):
+    previous = conn.execute(
+        "SELECT rowid, title, blob, segments FROM transcripts WHERE channel = ? AND video_id = ?",
+        (channel, video_id),
+    ).fetchone()
+    encoded = transcript.encode("utf-8")
+    digest = put_blob(encoded)
+    if segments is not None:
+        segments_digest = put_blob(encode_segments(segments, encoded)) if segments else ""
     else:
-        return {
-            "transcripts": {},  # structure: {channel: {video_title: transcript_text}}
-            "download_progress": {"downloaded": 0, "total": 0},
-            "failed_downloads": []
-        }
+        segments_digest = previous[3] if previous else ""
+        if segments_digest and previous[2] != digest:
+            # The kept segments may take their text from the old body; give them their own copy.
+            data = read_blob(segments_digest)
+            if segments_share_text(data):
+                segments_digest = put_blob(decode_segments(data, read_blob(previous[2])).to_bytes())
+    if previous:
+        _journal["orphans"].update(
+            old for old, new in zip(previous[2:], (digest, segments_digest)) if old and old != new
+        )
+    conn.execute(
+        "INSERT INTO transcripts (channel, video_id, title, blob, segments) VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT (channel, video_id) DO UPDATE SET "
+        "title = excluded.title, blob = excluded.blob, segments = excluded.segments",
+        (channel, video_id, title, digest, segments_digest),
+    )
+    # Looked up rather than taken from RETURNING, which needs SQLite 3.35.
+    rowid = conn.execute(
+        "SELECT rowid FROM transcripts WHERE channel = ? AND video_id = ?", (channel, video_id)
+    ).fetchone()[0]
+    if not previous or previous[1:3] != (title, digest):
+        if previous:
+            _unindex_transcript(conn, previous[0], previous[1], previous[2])
+        _index_transcript(conn, rowid, title, transcript)
+    conn.execute("DELETE FROM missing_transcripts WHERE video_id = ?", (video_id,))
+
+def _write_state(conn: sqlite3.Connection, state: dict) -> None:
+    """Upserts every record of a state dict; records missing from the dict are kept."""
+    for channel, videos in state.get("transcripts", {}).items():
+        for video_id, info in videos.items():
+            if "transcript" in info:
+                _upsert_transcript(conn, channel, video_id, info.get("title", ""), info["transcript"])
+                _transcript_cache.pop((channel, video_id), None)
+    conn.executemany(
+        "INSERT OR IGNORE INTO downloaded_links (url) VALUES (?)",
+        ((url,) for url in state.get("downloaded_links", [])),
+    )
+    known_failures = {
+        (url, error) for url, error in conn.execute("SELECT url, error FROM failed_downloads")
+    }
+    for failure in state.get("failed_downloads", []):
+        key = (failure.get("url"), failure.get("error"))
+        if key not in known_failures:
+            conn.execute("INSERT INTO failed_downloads (url, error) VALUES (?, ?)", key)
+            known_failures.add(key)
+    for key, value in state.items():
+        if key not in ("transcripts", "downloaded_links", "failed_downloads"):
+            _set_setting(conn, key, value)
+
+def load_persistent_state(include_transcripts: bool = True):
+    """
+    Loads the whole state as a dict. With include_transcripts=False only the
+    transcript index is read ({channel: {video_id: {"title": ...}}}); bodies
+    can then be fetched one at a time with get_transcript().
+    """
+    print("DEBUG: Looking for persistence database at:", os.path.abspath(DATABASE_FILE))
+    state = default_state()
+    with _lock:
+        conn = _reader()
+        if include_transcripts:
+            for channel, video_id, title, transcript in iter_transcripts():
+                state["transcripts"].setdefault(channel, {})[video_id] = {
+                    "title": title,
+                    "transcript": transcript,
+                }
+        else:
+            for channel, videos in load_transcript_index().items():
+                state["transcripts"][channel] = {
+                    video_id: {"title": title} for video_id, title in videos.items()
+                }
+        state["downloaded_links"] = [
+            url for (url,) in conn.execute("SELECT url FROM downloaded_links ORDER BY rowid")
+        ]
+        state["failed_downloads"] = [
+            {"url": url, "error": error}
+            for url, error in conn.execute("SELECT url, error FROM failed_downloads ORDER BY id")
+        ]
+        for key, value in conn.execute("SELECT key, value FROM settings WHERE key != 'json_migrated'"):
+            state[key] = json.loads(value)
+    return state
 
 def save_persistent_state(state: dict):
-    target_dir = os.path.dirname(PERSISTENCE_FILE)
-    os.makedirs(target_dir, exist_ok=True)
-    abs_path = os.path.abspath(PERSISTENCE_FILE)
-    print("DEBUG: Saving persistent state to:", abs_path)
-    with open(PERSISTENCE_FILE, "w") as f:
-        json.dump(state, f, indent=2)
-    if os.path.exists(PERSISTENCE_FILE):
-        print("DEBUG: Saved file size (bytes):", os.path.getsize(PERSISTENCE_FILE))
+    """
+    Bulk upsert of a whole state dict, committed immediately. Records are merged
+    into what is stored (by this or any other process) rather than replacing it.
+    Hot paths should prefer the per-record helpers (save_transcript,
+    add_downloaded_link, ...), which are journaled and committed in batches.
+    """
+    _mutation(lambda conn: _write_state(conn, state), durable=True)
 
 def clear_persistent_state():
-    """Empties the persistent state file (resets transcripts)."""
-    state = {
-        "transcripts": {},
-        "download_progress": {"downloaded": 0, "total": 0},
-        "failed_downloads": []
-    }
-    save_persistent_state(state)
+    """Empties the persistent store (resets transcripts, links, failures and cookies)."""
+    state = default_state()
+
+    def op(conn):
+        conn.execute("DELETE FROM transcripts")
+        conn.execute("INSERT INTO transcript_search (transcript_search) VALUES ('delete-all')")
+        conn.execute("DELETE FROM downloaded_links")
+        conn.execute("DELETE FROM failed_downloads")
+        conn.execute("DELETE FROM video_info")
+        conn.execute("DELETE FROM missing_transcripts")
+        conn.execute("DELETE FROM channel_listings")
+        conn.execute("DELETE FROM channel_videos")
+        conn.execute("DELETE FROM channel_names")
+        conn.execute("DELETE FROM media_files")
+        conn.execute("DELETE FROM stored_files")
+        conn.execute("DELETE FROM settings WHERE key != 'json_migrated'")
+        _set_setting(conn, "download_progress", state["download_progress"])
+
+    with _lock:
+        _mutation(op, durable=True)
+        _transcript_cache.clear()
+        with _write_transaction(get_connection()) as conn:
+            collect_garbage(_referenced_blobs(conn))
+        compact_persistent_state()
     return state
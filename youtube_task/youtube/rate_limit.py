@@ -0,0 +1,146 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Requests per second each host starts at; the limiter then adapts (AIMD):
+# every successful request adds ~ADDITIVE_INCREASE req/s per second of traffic,
+# every throttling response (HTTP 429, "too many requests", bot checks)
+# multiplies the rate by MULTIPLICATIVE_DECREASE.
+YOUTUBE_HOST = "www.youtube.com"
+THUMBNAIL_HOST = "img.youtube.com"
+DEFAULT_RATE = 2.0
+HOST_RATES = {
+    YOUTUBE_HOST: 2.0,
+    THUMBNAIL_HOST: 10.0,
+}
+MIN_RATE = 0.1
+MAX_RATE = 20.0
+BURST = 2
+ADDITIVE_INCREASE = 0.2
+MULTIPLICATIVE_DECREASE = 0.5
+# Throttling errors from requests that were already in flight when the rate
+# was cut are not counted again within this window.
+DECREASE_COOLDOWN_SECONDS = 2.0
+
+THROTTLE_MARKERS = (
+    "http error 429",
+    "429 client error",
+    "too many requests",
+    "rate limit",
+    "rate-limit",
+    "not a bot",
+    "requestblocked",
+    "ipblocked",
+)
+
+class RateLimiter:
+    """Thread-safe token bucket whose refill rate adapts to throttling (AIMD)."""
+
+    def __init__(self, rate: float = DEFAULT_RATE, burst: int = BURST):
+        self.rate = rate
+        self.burst = burst
+        self.waiting = 0
+        self.requests = 0
+        self.throttled = 0
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self) -> None:
+        """Blocks until the next request to this host may be sent."""
+        with self._lock:
+            self.waiting += 1
+        try:
+            while True:
+                with self._lock:
+                    self._refill(time.monotonic())
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        self.requests += 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+                time.sleep(wait)
+        finally:
+            with self._lock:
+                self.waiting -= 1
+
+    def on_success(self) -> None:
+        with self._lock:
+            self.rate = min(MAX_RATE, self.rate + ADDITIVE_INCREASE / self.rate)
+
+    def on_throttle(self) -> None:
+        with self._lock:
+            self.throttled += 1
+            now = time.monotonic()
+            if now - self._last_decrease < DECREASE_COOLDOWN_SECONDS:
+                return
+            self._last_decrease = now
+            self.rate = max(MIN_RATE, self.rate * MULTIPLICATIVE_DECREASE)
+            # Drain the bucket so the next request really waits for the new rate.
+            self._refill(now)
+            self._tokens = min(self._tokens, 0.0)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "rate": round(self.rate, 2),
+                "queue_depth": self.waiting,
+                "requests": self.requests,
+                "throttled": self.throttled,
+            }
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def get_rate_limiter(host: str) -> RateLimiter:
+    """Returns the process-wide limiter for host, creating it on first use."""
+    with _limiters_lock:
+        if host not in _limiters:
+            _limiters[host] = RateLimiter(HOST_RATES.get(host, DEFAULT_RATE))
+        return _limiters[host]
+
+def rate_limiter_stats() -> dict:
+    """Returns {host: {"rate", "queue_depth", "requests", "throttled"}} for every host used so far."""
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    return {host: limiter.stats() for host, limiter in limiters.items()}
+
+def is_throttle_error(error) -> bool:
+    text = f"{type(error).__name__} {error}".lower()
+    return any(marker in text for marker in THROTTLE_MARKERS)
+
+class _Request:
+    """One request made under rate_limited(); its outcome is reported to the host's limiter once."""
+
+    def __init__(self, limiter: RateLimiter):
+        self.limiter = limiter
+        self.throttled = False
+
+    def on_throttle(self) -> None:
+        if not self.throttled:
+            self.throttled = True
+            self.limiter.on_throttle()
+
+@contextmanager
+def rate_limited(host: str):
+    """
+    Waits for the host's limiter, then runs the block as one request: a
+    throttling exception slows the host down, a clean exit speeds it up.
+    Call on_throttle() on the yielded request for 429 responses that do not
+    raise; the request then does not count as a success.
+    """
+    request = _Request(get_rate_limiter(host))
+    request.limiter.acquire()
+    try:
+        yield request
+    except Exception as e:
+        if is_throttle_error(e):
+            request.on_throttle()
+        raise
+    if not request.throttled:
+        request.limiter.on_success()
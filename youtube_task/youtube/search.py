@@ -0,0 +1,55 @@
+import re
+from persistence import search_transcript_index, get_transcript_segments, get_transcript
+
+# Full-text search over stored transcripts. The ranking comes from the SQLite
+# FTS5 index kept up to date by persistence.save_transcript; only the top hits
+# are loaded to build a snippet and the timestamp of the first matching segment.
+SEARCH_RESULT_LIMIT = 20
+SNIPPET_CONTEXT_SEGMENTS = 1
+SNIPPET_CONTEXT_CHARS = 80
+# Words; a trailing * makes a word match as a prefix ("transl*").
+TERM_PATTERN = re.compile(r"\w+\*?")
+
+def query_terms(query: str) -> list:
+    return TERM_PATTERN.findall(query or "")
+
+def fts_query(terms: list) -> str:
+    # Every term must match. Terms are quoted so user input is never parsed as FTS5 syntax.
+    return " ".join(f'"{term.rstrip("*")}"' + ("*" if term.endswith("*") else "") for term in terms)
+
+def _snippet(channel: str, video_id: str, pattern: re.Pattern) -> tuple:
+    segments = get_transcript_segments(channel, video_id)
+    for i, segment in enumerate(segments):
+        if pattern.search(segment.text):
+            context = segments[max(0, i - SNIPPET_CONTEXT_SEGMENTS):i + SNIPPET_CONTEXT_SEGMENTS + 1]
+            return " ".join(s.text for s in context), segment.start
+    # No timed segments (older transcripts) or the match is in the title only.
+    text = get_transcript(channel, video_id) or ""
+    match = pattern.search(text)
+    position = match.start() if match else 0
+    start = max(0, position - SNIPPET_CONTEXT_CHARS)
+    snippet = text[start:position + 2 * SNIPPET_CONTEXT_CHARS]
+    return ("…" if start else "") + snippet + "…", None
+
+def search_transcripts(query: str, limit: int = SEARCH_RESULT_LIMIT) -> list:
+    """
+    Returns ranked hits for query as dicts with channel, video_id, title,
+    snippet and start (seconds into the video of the first matching segment,
+    or None when the transcript has no timing).
+    """
+    terms = query_terms(query)
+    if not terms:
+        return []
+    words = [term.rstrip("*") for term in terms]
+    pattern = re.compile(r"\b(?:" + "|".join(map(re.escape, words)) + ")", re.IGNORECASE)
+    hits = []
+    for channel, video_id, title in search_transcript_index(fts_query(terms), limit):
+        snippet, start = _snippet(channel, video_id, pattern)
+        hits.append({
+            "channel": channel,
+            "video_id": video_id,
+            "title": title,
+            "snippet": snippet,
+            "start": start,
+        })
+    return hits
@@ -0,0 +1,173 @@
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from persistence import (
+    get_state_value,
+    set_state_value,
+    track_stored_file,
+    stored_files_usage,
+    load_stored_files_lru,
+    forget_stored_files,
+)
+
+# Disk quotas for downloaded artifacts. Every managed file is recorded with its
+# size and last access; when a kind goes over its quota, a background thread
+# deletes its least recently used files until it fits again. Files in use in
+# this process (pinned with in_use) and files used within
+# EVICTION_GRACE_SECONDS (which covers other processes and pages still showing
+# them) are never evicted. Besides on request (a new download, a finished queue
+# item, a quota change), the check runs every EVICTION_INTERVAL_SECONDS, so
+# files over quota go once their grace period ends. A quota set with
+# set_storage_quota is kept in the store and applies to every process.
+MEDIA = "media"
+THUMBNAILS = "thumbnails"
+STORAGE_QUOTAS = {
+    MEDIA: 10 * 1024 ** 3,
+    THUMBNAILS: 200 * 1024 ** 2,
+}
+EVICTION_GRACE_SECONDS = 15 * 60
+EVICTION_INTERVAL_SECONDS = 60
+# Folders between a file and its kind's root (data/media/<video_id>/<format key>/),
+# removed once eviction leaves them empty.
+STORAGE_DIR_DEPTH = {
+    MEDIA: 2,
+    THUMBNAILS: 0,
+}
+
+_stats = {kind: Counter() for kind in STORAGE_QUOTAS}
+_stats_lock = threading.Lock()
+_pinned = Counter()
+_pinned_lock = threading.Lock()
+_evict_lock = threading.Lock()
+_eviction_requested = threading.Event()
+_evictor = None
+_evictor_lock = threading.Lock()
+
+def storage_quota(kind: str) -> int:
+    return get_state_value(f"storage_quota_{kind}", STORAGE_QUOTAS[kind])
+
+def set_storage_quota(kind: str, quota_bytes: int) -> None:
+    set_state_value(f"storage_quota_{kind}", int(quota_bytes))
+    request_eviction()
+
+def _count(kind: str, **amounts) -> None:
+    with _stats_lock:
+        _stats[kind].update(amounts)
+
+def track_file(kind: str, path: str, hit: bool) -> None:
+    """
+    Records a lookup of a managed file: hit for one served from disk, miss for
+    one just downloaded. Either way the file becomes the most recently used,
+    and a miss (new bytes on disk) triggers an eviction check.
+    """
+    track_stored_file(kind, path, os.path.getsize(path))
+    _count(kind, hits=int(hit), misses=int(not hit))
+    if hit:
+        _start_evictor()
+    else:
+        request_eviction()
+
+@contextmanager
+def in_use(*paths):
+    """Keeps paths from being evicted while the block runs (e.g. while they are read to be served)."""
+    with _pinned_lock:
+        _pinned.update(paths)
+    try:
+        yield
+    finally:
+        with _pinned_lock:
+            _pinned.subtract(paths)
+            for path in paths:
+                if _pinned[path] <= 0:
+                    del _pinned[path]
+
+def _remove_empty_dirs(path: str, depth: int) -> None:
+    directory = os.path.dirname(path)
+    for _ in range(depth):
+        try:
+            os.rmdir(directory)
+        except OSError:
+            # Not empty (or already gone)
+            return
+        directory = os.path.dirname(directory)
+
+def evict(kind: str) -> int:
+    """Deletes least recently used files of a kind until it fits its quota; returns the bytes freed."""
+    with _evict_lock:
+        _, used = stored_files_usage(kind)
+        quota = storage_quota(kind)
+        if used <= quota:
+            return 0
+        freed = 0
+        removed = []
+        cutoff = time.time() - EVICTION_GRACE_SECONDS
+        for path, size, accessed_at in load_stored_files_lru(kind):
+            if used - freed <= quota or accessed_at > cutoff:
+                # Everything from here on was used more recently still.
+                break
+            with _pinned_lock:
+                if _pinned[path] > 0:
+                    continue
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    print(f"INFO: could not evict {path}: {e}")
+                    continue
+            _remove_empty_dirs(path, STORAGE_DIR_DEPTH[kind])
+            removed.append(path)
+            freed += size
+        if removed:
+            forget_stored_files(removed)
+            _count(kind, evicted_files=len(removed), evicted_bytes=freed)
+            print(f"INFO: evicted {len(removed)} {kind} file(s), {freed} bytes")
+        return freed
+
+def _evict_in_background() -> None:
+    while True:
+        _eviction_requested.wait(EVICTION_INTERVAL_SECONDS)
+        _eviction_requested.clear()
+        for kind in STORAGE_QUOTAS:
+            try:
+                evict(kind)
+            except Exception as e:
+                print(f"ERROR: eviction of {kind} files failed: {e}")
+
+def _start_evictor() -> None:
+    global _evictor
+    with _evictor_lock:
+        if _evictor is None:
+            _evictor = threading.Thread(target=_evict_in_background, name="storage-evict", daemon=True)
+            _evictor.start()
+
+def request_eviction() -> None:
+    """Wakes the background evictor; returns at once."""
+    _start_evictor()
+    _eviction_requested.set()
+
+def storage_stats() -> dict:
+    """
+    Returns {kind: {"files", "used", "quota", "hits", "misses", "hit_rate",
+    "evicted_files", "evicted_bytes"}}; the counters are this process's since
+    it started.
+    """
+    stats = {}
+    for kind in STORAGE_QUOTAS:
+        files, used = stored_files_usage(kind)
+        with _stats_lock:
+            counts = dict(_stats[kind])
+        lookups = counts.get("hits", 0) + counts.get("misses", 0)
+        stats[kind] = {
+            "files": files,
+            "used": used,
+            "quota": storage_quota(kind),
+            "hits": counts.get("hits", 0),
+            "misses": counts.get("misses", 0),
+            "hit_rate": counts.get("hits", 0) / lookups if lookups else None,
+            "evicted_files": counts.get("evicted_files", 0),
+            "evicted_bytes": counts.get("evicted_bytes", 0),
+        }
+    return stats
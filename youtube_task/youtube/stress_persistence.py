@@ -0,0 +1,140 @@
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import persistence
+from persistence import (
+    save_transcript,
+    delete_channel,
+    add_downloaded_link,
+    record_failed_download,
+    set_state_value,
+    get_state_value,
+    get_transcript,
+    load_transcript_index,
+    load_downloaded_links,
+    load_persistent_state,
+    flush_persistent_state,
+)
+
+# Stress test for persistence.py with several processes sharing one store:
+#
+#   python stress_persistence.py --processes 12 --records 200
+#
+# Writer processes save transcripts, links, failures and settings at the same
+# time, each with a different journal batch size. Some transcript bodies are
+# shared by every writer, and a deleter process keeps adding and deleting a
+# channel that uses those bodies, so blob garbage collection races the
+# writers. Afterwards every record must be readable from the store. Runs in a
+# temporary directory; the app's data/ is not touched.
+BATCH_SIZES = (1, 7, 50)
+# Every this many records a writer uses a body shared by all writers.
+SHARED_EVERY = 5
+SCRATCH_CHANNEL = "scratch"
+
+def _video_id(writer: int, n: int) -> str:
+    return f"w{writer:02d}v{n:07d}"
+
+def _body(writer: int, n: int) -> str:
+    if n % SHARED_EVERY == 0:
+        return f"shared transcript {n}"
+    return f"transcript {n} of writer {writer}"
+
+def _writer(workdir: str, writer: int, records: int, go) -> None:
+    os.chdir(workdir)
+    persistence.JOURNAL_BATCH_SIZE = BATCH_SIZES[writer % len(BATCH_SIZES)]
+    go.wait()
+    for n in range(records):
+        video_id = _video_id(writer, n)
+        save_transcript(f"writer-{writer}", video_id, f"Title {video_id}", _body(writer, n))
+        add_downloaded_link(f"https://www.youtube.com/watch?v={video_id}")
+        record_failed_download(f"https://www.youtube.com/watch?v=x{video_id}", f"error {n}")
+        set_state_value(f"writer_{writer}", n)
+        if n % 25 == 0:
+            # Reads flush this process's queue in the middle of other processes' writes.
+            load_downloaded_links()
+    flush_persistent_state()
+
+def _deleter(workdir: str, records: int, stop, go) -> None:
+    os.chdir(workdir)
+    go.wait()
+    while not stop.is_set():
+        for n in range(0, records, SHARED_EVERY):
+            save_transcript(SCRATCH_CHANNEL, f"s{n:010d}", "Scratch", f"shared transcript {n}")
+        delete_channel(SCRATCH_CHANNEL)
+
+def check_store(writers: int, records: int) -> list:
+    """Returns a description of every lost or damaged record (empty if none)."""
+    problems = []
+    index = load_transcript_index()
+    links = load_downloaded_links()
+    state = load_persistent_state(include_transcripts=False)
+    failures = {failure["url"] for failure in state["failed_downloads"]}
+    if SCRATCH_CHANNEL in index:
+        problems.append(f"channel {SCRATCH_CHANNEL} was not deleted")
+    for writer in range(writers):
+        channel = f"writer-{writer}"
+        for n in range(records):
+            video_id = _video_id(writer, n)
+            if video_id not in index.get(channel, {}):
+                problems.append(f"transcript {channel}/{video_id} lost")
+            else:
+                try:
+                    if get_transcript(channel, video_id) != _body(writer, n):
+                        problems.append(f"transcript {channel}/{video_id} has the wrong body")
+                except FileNotFoundError:
+                    problems.append(f"transcript {channel}/{video_id} lost its blob")
+            if f"https://www.youtube.com/watch?v={video_id}" not in links:
+                problems.append(f"downloaded link of {video_id} lost")
+            if f"https://www.youtube.com/watch?v=x{video_id}" not in failures:
+                problems.append(f"failed download of {video_id} lost")
+        if get_state_value(f"writer_{writer}") != records - 1:
+            problems.append(f"setting writer_{writer} is {get_state_value(f'writer_{writer}')}")
+    return problems
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run concurrent writer processes against one store and check nothing is lost.")
+    parser.add_argument("--processes", type=int, default=12, help="writer processes (default 12)")
+    parser.add_argument("--records", type=int, default=200, help="transcripts each writer saves (default 200)")
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    # Fresh interpreters, as separate Streamlit servers or workers would be.
+    context = multiprocessing.get_context("spawn")
+    go, stop = context.Event(), context.Event()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        # Create the schema once up front, like an app that is already running.
+        flush_persistent_state()
+        load_transcript_index()
+        writers = [
+            context.Process(target=_writer, args=(workdir, writer, args.records, go))
+            for writer in range(args.processes)
+        ]
+        deleter = context.Process(target=_deleter, args=(workdir, args.records, stop, go))
+        for process in writers + [deleter]:
+            process.start()
+        started = time.perf_counter()
+        go.set()
+        for process in writers:
+            process.join()
+        stop.set()
+        deleter.join()
+        elapsed = time.perf_counter() - started
+        crashed = [process.pid for process in writers + [deleter] if process.exitcode != 0]
+        problems = check_store(args.processes, args.records)
+        flush_persistent_state()
+        os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    for problem in problems[:20]:
+        print("ERROR:", problem)
+    if crashed:
+        print("ERROR: processes exited with an error:", crashed)
+    print(f"INFO: {args.processes} writers x {args.records} records in {elapsed:.1f}s, "
+          f"{len(problems)} lost or damaged")
+    return 1 if problems or crashed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
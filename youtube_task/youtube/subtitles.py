@@ -0,0 +1,329 @@
+import html
+import itertools
+import json
+import re
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from typing import NamedTuple
+
+# Caption parsing shared by every transcript source. Parsers are generators
+# that consume the HTTP response a chunk at a time and yield one Segment per
+# cue, so memory stays bounded by the largest cue, not the whole file.
+READ_CHUNK_SIZE = 64 * 1024
+# Formats the parsers understand, in order of preference.
+SUPPORTED_FORMATS = ("json3", "vtt", "srt")
+# Inline cue markup: <c>, <i>, <v Speaker>, karaoke timestamps <00:00:01.234>, ...
+CUE_TAG_PATTERN = re.compile(r"<[^>]*>")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+class Segment(NamedTuple):
+    start: float
+    duration: float
+    text: str
+
+def _parse_timestamp(value: str) -> float:
+    # "01:02:03.456", "02:03.456" (VTT) or "01:02:03,456" (SRT)
+    seconds = 0.0
+    for part in value.strip().replace(",", ".").split(":"):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+def _iter_lines(chunks):
+    pending = ""
+    for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    if pending:
+        yield pending.rstrip("\r")
+
+def parse_cues(lines):
+    """
+    Parses WebVTT or SRT cues from an iterable of lines. Headers, cue
+    identifiers / SRT counters, NOTE and STYLE blocks are skipped. A cue's
+    lines are kept (joined with newlines) and its markup is left in place;
+    see normalize_segments.
+    """
+    start = end = None
+    text = []
+    for line in lines:
+        if "-->" in line:
+            if start is not None and text:
+                yield Segment(start, max(0.0, end - start), "\n".join(text))
+            begin, _, rest = line.partition("-->")
+            try:
+                start, end = _parse_timestamp(begin), _parse_timestamp(rest.split()[0])
+            except (ValueError, IndexError):
+                start = None
+            text = []
+        elif not line:
+            if start is not None and text:
+                yield Segment(start, max(0.0, end - start), "\n".join(text))
+            start = None
+            text = []
+        elif start is not None and line.strip():
+            # Whitespace-only lines (YouTube pads cues with " ") do not end a cue.
+            text.append(line.strip())
+    if start is not None and text:
+        yield Segment(start, max(0.0, end - start), "\n".join(text))
+
+def parse_json3(chunks):
+    """
+    Parses YouTube's json3 caption format from an iterable of text chunks,
+    decoding one event object at a time instead of the whole document.
+    """
+    decoder = json.JSONDecoder()
+    chunks = iter(chunks)
+    buffer = ""
+    # Skip ahead to the opening bracket of the "events" array.
+    for chunk in chunks:
+        buffer += chunk
+        key = buffer.find('"events"')
+        if key == -1:
+            buffer = buffer[-len('"events"'):]
+            continue
+        bracket = buffer.find("[", key)
+        if bracket != -1:
+            buffer = buffer[bracket + 1:]
+            break
+    else:
+        return
+    pos = 0
+    while True:
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+            pos += 1
+        if buffer.startswith("]", pos):
+            return
+        try:
+            event, pos = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            chunk = next(chunks, None)
+            if chunk is None:
+                return
+            # Keep only the undecoded tail, so the buffer never outgrows one event plus a chunk.
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+        text = "".join(seg.get("utf8", "") for seg in event.get("segs", [])).strip()
+        if text:
+            yield Segment(
+                event.get("tStartMs", 0) / 1000,
+                event.get("dDurationMs", 0) / 1000,
+                text,
+            )
+
+def iter_segments(chunks):
+    """Detects the caption format from the first chunk and yields its segments."""
+    chunks = iter(chunks)
+    head = ""
+    for chunk in chunks:
+        head += chunk
+        if head.strip():
+            break
+    chunks = itertools.chain([head], chunks)
+    if head.lstrip("\ufeff \t\r\n").startswith("{"):
+        return parse_json3(chunks)
+    return parse_cues(_iter_lines(chunks))
+
+def iter_response_segments(response, chunk_size: int = READ_CHUNK_SIZE):
+    """Streams segments from a requests response opened with stream=True."""
+    # YouTube serves captions as UTF-8 but does not always declare a charset.
+    response.encoding = "utf-8"
+    return iter_segments(response.iter_content(chunk_size=chunk_size, decode_unicode=True))
+
+def clean_caption_text(text: str) -> str:
+    """Strips cue markup and entities from one caption line and collapses whitespace."""
+    return WHITESPACE_PATTERN.sub(" ", html.unescape(CUE_TAG_PATTERN.sub("", text))).strip()
+
+def _carried_over(previous: list, lines: list) -> int:
+    # Length of the longest run of lines that ends previous and starts lines.
+    for count in range(min(len(previous), len(lines)), 0, -1):
+        if previous[-count:] == lines[:count]:
+            return count
+    return 0
+
+def normalize_segments(segments):
+    """
+    Cleans caption segments in one pass. Cue markup is stripped, and lines
+    repeated from the previous cue (YouTube's rolling auto-captions show every
+    line two or three times) are dropped. A cue that adds no new line only
+    extends the previous segment's duration.
+    """
+    current = None
+    previous_lines = []
+    for segment in segments:
+        lines = [line for line in map(clean_caption_text, segment.text.split("\n")) if line]
+        new_lines = lines[_carried_over(previous_lines, lines):]
+        previous_lines = lines
+        if not new_lines:
+            if current is not None:
+                end = max(current.start + current.duration, segment.start + segment.duration)
+                current = current._replace(duration=end - current.start)
+            continue
+        if current is not None:
+            yield current
+        current = Segment(segment.start, segment.duration, " ".join(new_lines))
+    if current is not None:
+        yield current
+
+def segments_from_api(transcript) -> list:
+    """
+    Converts youtube-transcript-api output to Segments: lists of dicts (0.x)
+    and FetchedTranscript snippets (1.x) alike.
+    """
+    segments = []
+    for item in transcript:
+        if isinstance(item, dict):
+            segments.append(Segment(float(item.get("start", 0)), float(item.get("duration", 0)), item.get("text", "")))
+        else:
+            segments.append(Segment(float(item.start), float(item.duration), item.text))
+    return segments
+
+def segments_text(segments) -> str:
+    return " ".join(filter(None, (segment.text.strip() for segment in segments)))
+
+# Stored layout of a SegmentTable (little-endian): magic, flags, segment
+# count n, n float32 starts, n float32 durations, n + 1 uint32 offsets into
+# the UTF-8 text, then the text itself unless SEGMENT_TABLE_SHARED_TEXT is set.
+# The text is the segments joined exactly as segments_text() does, so it can
+# be the transcript body already in the store rather than a second copy.
+# float32 keeps ~1 ms precision up to four hours (~4 ms at ten), plenty here.
+SEGMENT_TABLE_MAGIC = b"SEG1"
+SEGMENT_TABLE_HEADER = struct.Struct("<4sII")
+SEGMENT_TABLE_SHARED_TEXT = 1
+
+class SegmentTable:
+    """
+    Timed segments stored column-wise: packed float32 start and duration
+    arrays, plus offsets into one UTF-8 text buffer (segment i spans
+    offsets[i]..offsets[i + 1], separator included). Behaves like a read-only
+    sequence of Segments; from_bytes() wraps serialized data without copying.
+    """
+
+    def __init__(self, starts, durations, offsets, text):
+        self.starts = starts
+        self.durations = durations
+        self.offsets = offsets
+        self.text = text
+
+    @classmethod
+    def from_segments(cls, segments) -> "SegmentTable":
+        segments = sorted(segments, key=lambda segment: segment.start)
+        starts = array("f", (segment.start for segment in segments))
+        durations = array("f", (segment.duration for segment in segments))
+        offsets = array("I", [0])
+        pieces = []
+        size = 0
+        for segment in segments:
+            text = segment.text.strip()
+            if text:
+                # The separator ends the previous segment's span
+                if pieces:
+                    pieces.append(b" ")
+                    size += 1
+                    offsets[-1] = size
+                encoded = text.encode("utf-8")
+                pieces.append(encoded)
+                size += len(encoded)
+            offsets.append(size)
+        return cls(starts, durations, offsets, b"".join(pieces))
+
+    @classmethod
+    def from_bytes(cls, data, text=None) -> "SegmentTable":
+        """
+        Wraps serialized data (bytes, mmap, ...) without copying it. text must
+        be given for tables stored with SEGMENT_TABLE_SHARED_TEXT.
+        """
+        view = memoryview(data)
+        magic, flags, count = SEGMENT_TABLE_HEADER.unpack_from(view)
+        if magic != SEGMENT_TABLE_MAGIC:
+            raise ValueError("not a segment table")
+        position = SEGMENT_TABLE_HEADER.size
+        columns = []
+        for code, length in (("f", count), ("f", count), ("I", count + 1)):
+            column = view[position:position + 4 * length]
+            if sys.byteorder == "little":
+                columns.append(column.cast(code))
+            else:
+                column = array(code, column.tobytes())
+                column.byteswap()
+                columns.append(column)
+            position += 4 * length
+        if flags & SEGMENT_TABLE_SHARED_TEXT:
+            if text is None:
+                raise ValueError("segment table text is stored separately")
+            text = memoryview(text)
+        else:
+            text = view[position:]
+        if len(text) != columns[2][-1]:
+            raise ValueError("segment table text does not match its offsets")
+        return cls(*columns, text)
+
+    def buffers(self, include_text: bool = True) -> list:
+        """The serialized form as a list of buffers, for writing without joining."""
+        columns = [memoryview(self.starts), memoryview(self.durations), memoryview(self.offsets)]
+        if sys.byteorder != "little":
+            columns = [array(column.format, column.tobytes()) for column in columns]
+            for column in columns:
+                column.byteswap()
+        flags = 0 if include_text else SEGMENT_TABLE_SHARED_TEXT
+        header = SEGMENT_TABLE_HEADER.pack(SEGMENT_TABLE_MAGIC, flags, len(self))
+        return [header, *columns, self.text] if include_text else [header, *columns]
+
+    def to_bytes(self, include_text: bool = True) -> bytes:
+        return b"".join(self.buffers(include_text))
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("segment index out of range")
+        text = str(self.text[self.offsets[index]:self.offsets[index + 1]], "utf-8")
+        return Segment(round(self.starts[index], 3), round(self.durations[index], 3), text.removesuffix(" "))
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def _range(self, start: float, end: float) -> tuple:
+        first = bisect_left(self.starts, start)
+        # Include earlier segments that are still running at start
+        while first > 0 and self.starts[first - 1] + self.durations[first - 1] > start:
+            first -= 1
+        return first, bisect_left(self.starts, end, lo=first)
+
+    def between(self, start: float, end: float) -> list:
+        """Segments overlapping [start, end) seconds, found by binary search on the start times."""
+        return self[slice(*self._range(start, end))]
+
+    def text_between(self, start: float, end: float) -> str:
+        """What was said in [start, end) seconds, sliced straight from the text buffer."""
+        first, last = self._range(start, end)
+        return str(self.text[self.offsets[first]:self.offsets[last]], "utf-8").removesuffix(" ")
+
+def encode_segments(segments, text: bytes | None = None) -> bytes:
+    """
+    Serializes segments as a SegmentTable. When text (the stored transcript
+    body) is exactly the segments' joined text, it is left out of the result.
+    """
+    table = segments if isinstance(segments, SegmentTable) else SegmentTable.from_segments(segments)
+    return table.to_bytes(include_text=text is None or table.text != text)
+
+def segments_share_text(data: bytes) -> bool:
+    """Whether decode_segments(data) needs the transcript body passed in."""
+    if bytes(data[:len(SEGMENT_TABLE_MAGIC)]) != SEGMENT_TABLE_MAGIC:
+        return False
+    return bool(SEGMENT_TABLE_HEADER.unpack_from(data)[1] & SEGMENT_TABLE_SHARED_TEXT)
+
+def decode_segments(data: bytes, text: bytes | None = None) -> SegmentTable:
+    if bytes(data[:len(SEGMENT_TABLE_MAGIC)]) == SEGMENT_TABLE_MAGIC:
+        return SegmentTable.from_bytes(data, text)
+    # Stored before the columnar layout: [[start, duration, text], ...]
+    return SegmentTable.from_segments(Segment(start, duration, text) for start, duration, text in json.loads(data))
@@ -1,6 +1,9 @@
+import os
 import streamlit as st
+from storage import in_use
 from thumbnail_downloader.state import state_init
 from thumbnail_downloader.callbacks import fetch_thumbnails
+from thumbnail_downloader.zip import zip_images
 
 def app():
     state_init()
@@ -98,7 +101,12 @@ def app():
         for ind in range(num_thumbnails):
             # Use .get() with a default value to avoid KeyError
             title = st.session_state.thumbnail_data_entries[ind].get("video_title", "Unknown Title")
-            with st.container():
+            savepath = st.session_state.thumbnail_savepaths[ind]
+            if not os.path.exists(savepath):
+                st.info(f"{os.path.basename(savepath)} was removed to free disk space.")
+                continue
+            # Not evicted while it is read for display
+            with in_use(savepath), st.container():
                 col1, col2 = st.columns([3, 5])
                 with col1:
                     st.image(st.session_state.thumbnail_savepaths[ind], caption=title, use_column_width=True)
@@ -117,16 +125,14 @@ def app():
 
     # Download Zip Button
     st.markdown("### 📥 Download All Thumbnails")
-    if "thumbnails_zip_path" in st.session_state and st.session_state.thumbnail_fetch_count > 0:
-        try:
-            with open(st.session_state.thumbnails_zip_path, "rb") as file:
-                st.download_button(
-                    label="📥 Download All as ZIP",
-                    data=file,
-                    file_name="thumbnails.zip",
-                    mime="application/zip",
-                    type="primary",
-                    key="button-download",
-                )
-        except Exception as e:
-            st.error(f"Error downloading zip: {e}")
+    if st.session_state.thumbnail_fetch_count > 0 and st.session_state.thumbnail_savepaths:
+        thumbnail_savepaths = st.session_state.thumbnail_savepaths
+        st.download_button(
+            label="📥 Download All as ZIP",
+            # Zipped only when the download is requested
+            data=lambda: zip_images(thumbnail_savepaths),
+            file_name="thumbnails.zip",
+            mime="application/zip",
+            type="primary",
+            key="button-download",
+        )
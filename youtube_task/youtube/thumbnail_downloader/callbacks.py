@@ -1,10 +1,9 @@
 import os
 from thumbnail_downloader.yt_thumbnail_downloader import get_batch_thumbnails
-from thumbnail_downloader.zip import zip_images
 from thumbnail_downloader.state import reset_state
+from thumbnail_downloader.config import default_thumbnail_dir
 import streamlit as st
 from io import StringIO
-import tempfile
 
 def urls_normalizer(uploaded_file: "st.uploaded", text_urls: str) -> list:
     youtube_urls = []
@@ -36,17 +35,14 @@ def fetch_logic(youtube_urls: list) -> None:
         reset_state()
     
     if st.session_state.thumbnail_fetch_count == 0:
-        # Create a temporary directory for saving thumbnails.
-        savedir = tempfile.mkdtemp()
+        # Thumbnails go to the managed folder, where earlier downloads are reused.
+        savedir = default_thumbnail_dir
+        os.makedirs(savedir, exist_ok=True)
         thumbnail_savepaths, thumbnail_data_entries = get_batch_thumbnails(youtube_urls, savedir)
         st.session_state.thumbnail_savepaths = thumbnail_savepaths
         st.session_state.thumbnail_data_entries = thumbnail_data_entries
         st.session_state.thumbnail_fetch_count += 1
 
-        # Create zip file path in the temporary directory.
-        st.session_state.thumbnails_zip_path = os.path.join(savedir, "thumbnails.zip")
-        zip_images(thumbnail_savepaths)
-
 def fetch_thumbnails(uploaded_file, text_urls):
     youtube_urls = urls_normalizer(uploaded_file, text_urls)
     fetch_logic(youtube_urls)
@@ -5,7 +5,9 @@ default_thumbnail_raw_urls = ""
 default_thumbnail_savepaths = []
 default_thumbnail_data_entries = []
 default_thumbnail_text_input_urls = ""
-default_thumbnails_zip_path = "data/input/blank.zip"  # Adjust as needed
+# Thumbnails are kept here (one file per video and size) and reused; they count
+# towards the thumbnail quota of storage.py.
+default_thumbnail_dir = "data/thumbnails"
 
 def default_thumbnail_location():
     with tempfile.TemporaryDirectory() as tmpdirname:
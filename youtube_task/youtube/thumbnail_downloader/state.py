@@ -5,7 +5,6 @@ from thumbnail_downloader.config import (
     default_thumbnail_location,
     default_thumbnail_data_entries,
     default_thumbnail_text_input_urls,
-    default_thumbnails_zip_path,
 )
 
 def state_init():
@@ -25,7 +24,6 @@ def state_init():
 def reset_state():
     st.session_state.thumbnail_savepaths = default_thumbnail_savepaths
     st.session_state.thumbnail_text_input_urls = default_thumbnail_text_input_urls
-    st.session_state.thumbnails_zip_path = default_thumbnails_zip_path
     st.session_state.thumbnail_text_input_urls = ""
     st.session_state.thumbnail_fetch_count = 0
     st.session_state.youtube_thumbnails_expander = False
@@ -2,6 +2,11 @@ import re
 import requests
 import os
 import streamlit as st
+from rate_limit import rate_limited, THUMBNAIL_HOST
+from storage import THUMBNAILS, track_file, in_use
+
+# Sizes tried, best first
+THUMBNAIL_SIZES = ["maxresdefault", "hqdefault", "mqdefault"]
 
 def is_valid_youtube_url(url: str) -> bool:
     """Checks if the URL is a valid YouTube video URL"""
@@ -28,25 +33,37 @@ def get_youtube_thumbnail_url(video_id: str) -> dict:
         "maxresdefault": f"https://img.youtube.com/vi/{video_id}/maxresdefault.jpg",
     }
 
+def _rate_limited_get(url: str, **kwargs) -> requests.Response:
+    with rate_limited(THUMBNAIL_HOST) as request:
+        response = requests.get(url, **kwargs)
+        if response.status_code == 429:
+            request.on_throttle()
+    return response
+
+def _save(savepath: str, content: bytes) -> None:
+    # Written under a temporary name, so an interrupted write is never reused as a thumbnail
+    tmp_path = savepath + ".tmp"
+    with open(tmp_path, "wb") as handler:
+        handler.write(content)
+    os.replace(tmp_path, savepath)
+
 def download_thumbnail(yt_thumbnail_url: str, savepath: str) -> None:
     """
     Downloads a YouTube thumbnail.
     If the initial request fails, it retries once with cookies attached (if available in st.session_state.youtube_cookies).
     """
     # First attempt without cookies.
-    response = requests.get(yt_thumbnail_url)
+    response = _rate_limited_get(yt_thumbnail_url)
     if response.status_code == 200:
-        with open(savepath, "wb") as handler:
-            handler.write(response.content)
+        _save(savepath, response.content)
         return
     # If failed, check for cookies in session state.
     cookies = st.session_state.get("youtube_cookies", "").strip() if "youtube_cookies" in st.session_state else ""
     if cookies:
         # Retry with cookies attached.
-        response = requests.get(yt_thumbnail_url, headers={"Cookie": cookies})
+        response = _rate_limited_get(yt_thumbnail_url, headers={"Cookie": cookies})
         if response.status_code == 200:
-            with open(savepath, "wb") as handler:
-                handler.write(response.content)
+            _save(savepath, response.content)
             print(f"✅ Downloaded with cookies: {savepath}")
             return
     # If still failing, raise an error.
@@ -57,16 +74,24 @@ def get_thumbnail(url: str, savedir: str) -> tuple:
     Fetches the best available YouTube thumbnail and saves it.
     Tries in order: maxresdefault, hqdefault, mqdefault.
     If a download fails, it will retry with cookies (if available).
+    A thumbnail already saved in savedir is returned without any request.
     """
     if not is_valid_youtube_url(url):
         raise ValueError(f"Invalid YouTube URL: {url}")
     video_id = extract_video_id(url)
     thumbnails = get_youtube_thumbnail_url(video_id)
-    for key in ["maxresdefault", "hqdefault", "mqdefault"]:
+    for key in THUMBNAIL_SIZES:
+        savepath = os.path.join(savedir, f"{video_id}_{key}.jpg")
+        with in_use(savepath):
+            if os.path.exists(savepath):
+                track_file(THUMBNAILS, savepath, hit=True)
+                return savepath, {"video_id": video_id, "thumbnail_url": thumbnails[key]}
+    for key in THUMBNAIL_SIZES:
         savepath = os.path.join(savedir, f"{video_id}_{key}.jpg")
         try:
             download_thumbnail(thumbnails[key], savepath)
             print(f"✅ Downloaded: {savepath}")
+            track_file(THUMBNAILS, savepath, hit=False)
             return savepath, {"video_id": video_id, "thumbnail_url": thumbnails[key]}
         except Exception as e:
             print(f"⚠️ Failed to download {key}: {e}")
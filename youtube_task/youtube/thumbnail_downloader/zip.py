@@ -1,13 +1,18 @@
+import io
 import zipfile
 import os
-import streamlit as st
+from storage import in_use
 
-def zip_images(image_paths: list):
+def zip_images(image_paths: list) -> bytes:
+    """Zips the images in memory (thumbnails are small); ones evicted meanwhile are left out."""
     print("INFO: zipping images...")
-    zip_filename = st.session_state.thumbnails_zip_path
-    with zipfile.ZipFile(zip_filename, "w") as zipf:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zipf, in_use(*image_paths):
         for image_path in image_paths:
+            if not os.path.exists(image_path):
+                continue
             _, filename = os.path.split(image_path)
             zipf.write(image_path, arcname=filename)
             print(f"Added {filename} to the zip file.")
-    print(f"...done! Images have been zipped into {zip_filename}")
+    print("...done!")
+    return buffer.getvalue()
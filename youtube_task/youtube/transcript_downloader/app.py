@@ -1,64 +1,98 @@
 import streamlit as st
 from transcript_downloader.callbacks import fetch_transcripts_and_prepare_downloads
 from transcript_downloader.state import state_init
-from persistence import load_persistent_state, clear_persistent_state
-from io import BytesIO
-import zipfile
+from transcript_downloader.zip import read_transcripts_zip
+from transcript_downloader.config import default_max_workers, default_missing_transcript_ttl_hours
+from persistence import (
+    clear_persistent_state,
+    load_transcript_index,
+    get_transcript,
+    save_transcript,
+    delete_channel,
+)
+from search import search_transcripts
+from export import EXPORT_FORMATS, TRANSCRIPT_COLUMNS, export_file, transcript_rows
+from metadata import video_url
 
 def app():
     state_init()
 
-    # Load persistent state from disk
-    persistent_state = load_persistent_state()
-    st.session_state["persistent_state"] = persistent_state
-
-    if persistent_state.get("transcripts"):
-        st.session_state.transcripts_by_video = persistent_state["transcripts"]
-    else:
-        st.session_state.transcripts_by_video = {}
+    # The page only needs the transcript index (titles); bodies are fetched on demand
+    st.session_state.transcript_index = load_transcript_index()
 
     # Button to clear persistent state
     if st.button("Clear Persistent State"):
         new_state = clear_persistent_state()
         st.session_state["persistent_state"] = new_state
-        st.session_state.transcripts_by_video = {}
-        st.experimental_rerun()
+        st.session_state.transcript_index = {}
+        st.rerun()
 
     st.markdown("<h1>📜 YouTube Transcript Downloader</h1>", unsafe_allow_html=True)
 
     # 1) Collect file or manual URLs
     manual_urls = st.text_area("Enter YouTube URLs (comma‑separated)", "", height=100)
     uploaded_file = st.file_uploader("Upload .txt with YouTube URLs", type=["txt"])
+    max_workers = st.slider("Parallel downloads", min_value=1, max_value=32, value=default_max_workers)
+    missing_ttl_hours = st.number_input(
+        "Skip videos without transcripts for (hours)",
+        min_value=0,
+        value=default_missing_transcript_ttl_hours,
+        step=24,
+    )
+    recheck_missing = st.checkbox("Re-check videos without transcripts now")
 
     # 2) Button to fetch them all (with partial updates)
     if st.button("Fetch Transcripts"):
-        fetch_transcripts_and_prepare_downloads(uploaded_file, manual_urls)
+        fetch_transcripts_and_prepare_downloads(uploaded_file, manual_urls, max_workers, missing_ttl_hours, recheck_missing)
         # Re-load persistent state to get final updates
         # persistent_state = load_persistent_state()
         # st.session_state["persistent_state"] = persistent_state
-        # st.session_state["transcripts_by_video"] = persistent_state.get("transcripts", {})
+        # st.session_state["transcript_index"] = load_transcript_index()
+
+    # 3) Search across the contents of all stored transcripts
+    if st.session_state.transcript_index:
+        st.markdown("## Search Transcripts")
+        query = st.text_input("Search transcripts", "", key="transcript_search")
+        if query.strip():
+            hits = search_transcripts(query)
+            if not hits:
+                st.info("No transcripts match your search.")
+            for hit in hits:
+                link = video_url(hit["video_id"])
+                if hit["start"] is not None:
+                    seconds = int(hit["start"])
+                    link += f"&t={seconds}s"
+                    label = f"{hit['title']} @ {seconds // 60}:{seconds % 60:02d}"
+                else:
+                    label = hit["title"]
+                st.markdown(f"**[{label}]({link})** · {hit['channel']}")
+                st.caption(hit["snippet"])
 
-    # 3) Single *final* dropdown for channels
-    if st.session_state.transcripts_by_video:
+    # 4) Single *final* dropdown for channels
+    if st.session_state.transcript_index:
         st.markdown("## View/Edit Downloaded Transcripts")
-        channels = list(st.session_state.transcripts_by_video.keys())
+        channels = list(st.session_state.transcript_index.keys())
         selected_channel = st.selectbox("Select Channel", channels, key="channel_select")
+        if st.button(f"Delete Channel '{selected_channel}'"):
+            delete_channel(selected_channel)
+            st.session_state.transcript_index.pop(selected_channel, None)
+            st.rerun()
 
-        videos_dict = st.session_state.transcripts_by_video[selected_channel]
-        video_ids = list(videos_dict.keys())
-        labels = [videos_dict[vid_id]["title"] for vid_id in video_ids]
+        titles_by_id = st.session_state.transcript_index[selected_channel]
+        video_ids = list(titles_by_id.keys())
+        labels = [titles_by_id[vid_id] for vid_id in video_ids]
 
         selected_label = st.selectbox("Select Video Transcript", labels, key="video_select")
         chosen_index = labels.index(selected_label)
         chosen_vid_id = video_ids[chosen_index]
 
-        # Show the transcript
-        transcript_text = videos_dict[chosen_vid_id]["transcript"]
-        new_text = st.text_area("Transcript", transcript_text, height=300, key="transcript_text_area")
+        # Show the transcript (only the selected body is loaded)
+        transcript_text = get_transcript(selected_channel, chosen_vid_id) or ""
+        new_text = st.text_area("Transcript", transcript_text, height=300, key=f"transcript_text_area_{selected_channel}_{chosen_vid_id}")
 
         # If user edits, update
-        videos_dict[chosen_vid_id]["transcript"] = new_text
-        st.session_state.transcripts_by_video[selected_channel] = videos_dict
+        if new_text != transcript_text:
+            save_transcript(selected_channel, chosen_vid_id, selected_label, new_text)
 
         # Download single
         st.download_button(
@@ -70,19 +104,21 @@ def app():
 
         # Download all as ZIP
         st.markdown("### Download All Transcripts as ZIP")
-        zip_buffer = BytesIO()
-        with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
-            for ch_name, channel_data in st.session_state.transcripts_by_video.items():
-                for vid_id, vid_info in channel_data.items():
-                    vid_title = vid_info["title"]
-                    text_data = vid_info["transcript"]
-                    safe_title = "".join(c if c.isalnum() else "_" for c in vid_title).strip()
-                    file_path = f"{ch_name}/{safe_title}.txt"
-                    zip_file.writestr(file_path, text_data)
-        zip_buffer.seek(0)
+        # Built (or taken from the export cache) only when the button is clicked
         st.download_button(
             "Download ZIP",
-            data=zip_buffer,
+            data=read_transcripts_zip,
             file_name="transcripts.zip",
             mime="application/zip"
         )
+
+        # Export all as a single file
+        st.markdown("### Export All Transcripts")
+        export_format = st.selectbox("Export format", list(EXPORT_FORMATS), key="transcript_export_format")
+        extension, mime, _ = EXPORT_FORMATS[export_format]
+        st.download_button(
+            f"Download {export_format}",
+            data=lambda: export_file(transcript_rows(), export_format, TRANSCRIPT_COLUMNS),
+            file_name=f"transcripts.{extension}",
+            mime=mime,
+        )
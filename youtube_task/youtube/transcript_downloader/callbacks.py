@@ -1,34 +1,44 @@
 import os
 import pandas as pd
 import streamlit as st
-import time
-import copy
-from transcript_downloader.yt_transcript_download import get_single_transcript
-from persistence import load_persistent_state, save_persistent_state
+from transcript_downloader.yt_transcript_download import iter_transcripts_concurrently
+from transcript_downloader.pipeline import known_video_ids, plan_fetches, store_transcript_entry
+from transcript_downloader.config import default_max_workers, default_missing_transcript_ttl_hours
+from export import format_txt_record, frame_rows
+from persistence import (
+    load_persistent_state,
+    load_transcript_index,
+    load_missing_transcripts,
+    flush_persistent_state,
+)
 
 def convert_to_txt(df: pd.DataFrame) -> str:
     """
-    Utility function (unchanged). Converts a DataFrame to a big text block.
+    Utility function. Converts a DataFrame to a big text block (same layout
+    as the TXT export, built in one join instead of row-by-row concatenation).
     """
-    txt_content = ""
-    for _, row in df.iterrows():
-        video_title = row.get("video_title", "Unknown Title")
-        youtube_url = row.get("youtube_url", "Unknown URL")
-        transcript_data = row.get("transcript", "")
-        if isinstance(transcript_data, list):
-            transcript_text = " ".join([entry.get("text", "") for entry in transcript_data])
-        else:
-            transcript_text = str(transcript_data)
-        txt_content += f"{video_title}\n{youtube_url}\n-------------------\n{transcript_text}\n\n"
-    return txt_content
-
-def fetch_transcripts_and_prepare_downloads(uploaded_file, text_urls):
+    return "".join(map(format_txt_record, frame_rows(df)))
+
+def truncate_and_append(txt, length=100, suffix="..."):
+    return txt[:length] + suffix if (isinstance(txt, str) and len(txt) > length) else txt
+
+def fetch_transcripts_and_prepare_downloads(
+    uploaded_file,
+    text_urls,
+    max_workers: int = default_max_workers,
+    missing_ttl_hours: float = default_missing_transcript_ttl_hours,
+    recheck_missing: bool = False,
+):
     """
     Modified to:
       1) Display skip/fetch messages in a single 'alert_placeholder'
          so that older alerts are replaced by new ones.
       2) Maintain a single 'partial_display_container' with a dropdown
          to select *any* already-downloaded transcript for preview.
+      3) Fetch up to max_workers transcripts in parallel; results are
+         saved and shown from this (the script) thread as they complete.
+      4) Skip videos found without a transcript in the last
+         missing_ttl_hours, unless recheck_missing is set.
     """
 
     # --- A) Gather the YouTube URLs ---
@@ -65,18 +75,19 @@ def fetch_transcripts_and_prepare_downloads(uploaded_file, text_urls):
         st.stop()
 
     # --- B) Load / init persistent storage
-    persistent_state = st.session_state.get("persistent_state", load_persistent_state())
-    if "transcripts" not in persistent_state:
-        persistent_state["transcripts"] = {}
-
+    persistent_state = st.session_state.get("persistent_state") or load_persistent_state(include_transcripts=False)
     if "downloaded_links" not in persistent_state:
         persistent_state["downloaded_links"] = []
-    downloaded_urls_set = set(persistent_state["downloaded_links"])
+    # {channel: {video_id: title}}; transcript bodies are never loaded here
+    transcript_index = load_transcript_index()
+    channel_index = transcript_index.get(channel, {})
 
-    channel_dict = persistent_state["transcripts"].get(channel, {})
+    known_ids = known_video_ids(channel_index)
+    # Video IDs that recently had no transcript at all (negative cache)
+    missing_ids = {} if recheck_missing else load_missing_transcripts(missing_ttl_hours * 3600)
 
-    # For building final summary
-    batch_transcripts = []
+    # Summary rows for the final table (transcripts truncated, full text is in the store)
+    summary_rows = []
 
     # Show a progress bar
     num_urls = len(youtube_urls)
@@ -87,73 +98,64 @@ def fetch_transcripts_and_prepare_downloads(uploaded_file, text_urls):
 
     st.write(f"**Starting to fetch transcripts for {num_urls} URL(s) in channel '{channel}'.**")
 
-    # --- C) Main loop with partial updates
-    for i, url in enumerate(youtube_urls):
-        # Overwrite the alert each iteration
-        alert_placeholder.info(f"Processing {i+1}/{num_urls}: {url}")
-
-        # 1) If this URL is already in downloaded_links, skip
-        if url in downloaded_urls_set:
-            alert_placeholder.warning(f"Skipping URL (already downloaded): {url}")
-            progress_bar.progress((i + 1) / num_urls)
-            time.sleep(1)
+    # --- C) Normalize URLs to video IDs and skip known or repeated ones before any fetch
+    processed = 0
+    urls_to_fetch = []
+    for url, fetch_url, skip_reason in plan_fetches(youtube_urls, known_ids, missing_ids):
+        if fetch_url:
+            urls_to_fetch.append(fetch_url)
             continue
-
-        # Otherwise, fetch the transcript
-        transcript_entry = get_single_transcript(url)
-        batch_transcripts.append(transcript_entry)
+        alert_placeholder.warning(f"Skipping URL ({skip_reason}): {url}")
+        processed += 1
+        progress_bar.progress(processed / num_urls)
+
+    # --- D) Fetch the rest in parallel, with partial updates as results arrive
+    cookies = st.session_state.get("youtube_cookies", "")
+    for url, transcript_entry, messages in iter_transcripts_concurrently(urls_to_fetch, max_workers, cookies):
+        processed += 1
+        # Overwrite the alert for each result
+        alert_placeholder.info(f"Processed {processed}/{num_urls}: {url}")
+        for message in messages:
+            st.warning(message)
 
         video_id = transcript_entry.get("video_id")
         video_title = transcript_entry.get("video_title", "Unknown Title")
-        raw_data = transcript_entry.get("transcript", "")
-
-        # If video_id is in channel_dict, skip
-        if video_id and video_id in channel_dict:
-            alert_placeholder.info(f"Skipping '{video_title}' (already fetched by video_id).")
-        else:
-            # Convert list to text
-            if isinstance(raw_data, list):
-                transcript_text = " ".join(seg.get("text", "") for seg in raw_data)
-            else:
-                transcript_text = str(raw_data)
-
-            alert_placeholder.success(f"Fetched transcript for '{video_title}'. Saving...")
-
-            if video_id:
-                channel_dict[video_id] = {
-                    "title": video_title,
-                    "transcript": transcript_text
-                }
-                persistent_state["transcripts"][channel] = channel_dict
-
-        # Add URL to downloaded set
-        downloaded_urls_set.add(url)
-        persistent_state["downloaded_links"] = list(downloaded_urls_set)
-
-        # Save partial
-        save_persistent_state(persistent_state)
+        status, transcript_text = store_transcript_entry(channel, url, transcript_entry)
+        summary_rows.append({
+            "youtube_url": transcript_entry.get("youtube_url", url),
+            "video_id": str(video_id),
+            "video_title": str(video_title),
+            "transcript": truncate_and_append(transcript_text),
+        })
+
+        if status == "saved":
+            alert_placeholder.success(f"Fetched transcript for '{video_title}'. Saved.")
+            channel_index[video_id] = video_title
+            transcript_index[channel] = channel_index
+            persistent_state["downloaded_links"].append(url)
+        elif status == "missing":
+            alert_placeholder.warning(f"No transcript for '{video_title}'.")
+        elif status == "failed":
+            # Nothing was stored, so the next fetch tries this video again
+            alert_placeholder.warning(f"Could not fetch the transcript for '{video_title}'.")
+
         st.session_state["persistent_state"] = persistent_state
 
         # Reflect updated transcripts
-        st.session_state["transcripts_by_video"] = persistent_state["transcripts"]
+        st.session_state["transcript_index"] = transcript_index
 
         # Update progress bar
-        progress_bar.progress((i + 1) / num_urls)
-        time.sleep(1)
+        progress_bar.progress(processed / num_urls)
 
+    # Commit whatever is left in the current journal batch
+    flush_persistent_state()
     alert_placeholder.success("All transcripts processed!")
     st.session_state["transcript_all_done"] = True
 
-    # Build a truncated DataFrame for final summary
-    df = pd.DataFrame(batch_transcripts)
-    def truncate_and_append(txt, length=100, suffix="..."):
-        return txt[:length] + suffix if (isinstance(txt, str) and len(txt) > length) else txt
-
-    df_table = copy.deepcopy(df).astype(str)
-    if "transcript" in df_table.columns:
-        df_table["transcript"] = df_table["transcript"].apply(lambda x: truncate_and_append(x))
+    # Final summary table, built from the truncated rows only
+    df_table = pd.DataFrame(summary_rows, columns=["youtube_url", "video_id", "video_title", "transcript"])
     st.session_state["transcript_data_table"] = df_table
 
-    st.session_state.transcripts_by_video = persistent_state["transcripts"]
+    st.session_state.transcript_index = transcript_index
     # final "Done" message
     st.success("Done fetching all transcripts!")
\ No newline at end of file
@@ -0,0 +1,5 @@
+# Number of transcripts fetched in parallel (each worker runs yt-dlp / transcript API calls).
+default_max_workers = 8
+# Videos found without any transcript are not probed again for this many hours
+# (unless a re-check is forced from the UI).
+default_missing_transcript_ttl_hours = 7 * 24
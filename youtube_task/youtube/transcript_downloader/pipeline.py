@@ -0,0 +1,66 @@
+from metadata import canonical_video_id, video_url
+from subtitles import segments_text
+from persistence import (
+    load_downloaded_links,
+    record_missing_transcript,
+    save_transcript,
+    add_downloaded_link,
+)
+
+# The parts of a transcript fetch that do not involve the UI, shared by the
+# Streamlit page (callbacks.py) and the headless harvester (harvest.py).
+
+def known_video_ids(channel_index: dict) -> set:
+    """
+    Video IDs that need no network call: stored for the channel, or linked as
+    downloaded (read from the store so other sessions' links count too).
+    """
+    known_ids = set(channel_index)
+    known_ids.update(filter(None, map(canonical_video_id, load_downloaded_links())))
+    return known_ids
+
+def plan_fetches(youtube_urls, known_ids: set, missing_ids: dict):
+    """
+    Yields (url, fetch_url, skip_reason) for each URL. fetch_url is the
+    canonical URL to fetch, or None when the URL is skipped for skip_reason.
+    known_ids is updated, so repeats of a video are skipped as well.
+    """
+    for url in youtube_urls:
+        video_id = canonical_video_id(url)
+        if video_id is None:
+            # Not a video URL; get_single_transcript reports it without a network call
+            yield url, url, None
+        elif video_id in known_ids:
+            yield url, None, "already downloaded"
+        elif video_id in missing_ids:
+            yield url, None, f"no transcript, {missing_ids[video_id]}"
+        else:
+            known_ids.add(video_id)
+            yield url, video_url(video_id), None
+
+def store_transcript_entry(channel: str, url: str, entry: dict) -> tuple:
+    """
+    Stores one get_single_transcript result and returns (status, transcript_text).
+    status is "saved" (stored, url marked downloaded), "missing" (recorded in
+    the negative cache), "failed" (nothing stored, so the next run retries it)
+    or "invalid" (not a video URL).
+    """
+    video_id = entry.get("video_id")
+    raw_data = entry.get("transcript", "")
+    # Segments are kept (timing included) next to the plain text
+    if isinstance(raw_data, list):
+        transcript_text = segments_text(raw_data)
+    else:
+        transcript_text = str(raw_data)
+    if not video_id:
+        return "invalid", transcript_text
+    if entry.get("missing_reason"):
+        # Not stored as a transcript and not marked downloaded, so it is retried once the TTL expires
+        record_missing_transcript(video_id, entry["missing_reason"])
+        return "missing", transcript_text
+    if not isinstance(raw_data, list):
+        return "failed", transcript_text
+    save_transcript(channel, video_id, entry.get("video_title", "Unknown Title"), transcript_text, raw_data)
+    # A single-row write, not a full-state rewrite
+    add_downloaded_link(url)
+    return "saved", transcript_text
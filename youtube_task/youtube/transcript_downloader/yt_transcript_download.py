@@ -1,12 +1,12 @@
-import json
 import re
-import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import List, Dict
 from youtube_transcript_api import YouTubeTranscriptApi, TranscriptsDisabled, NoTranscriptFound
-import streamlit as st
-import yt_dlp
 import requests
-import tempfile
+from transcript_downloader.config import default_max_workers
+from metadata import extract_video_info, select_subtitle_url, canonical_video_id
+from rate_limit import rate_limited, is_throttle_error, YOUTUBE_HOST
+from subtitles import iter_response_segments, normalize_segments, segments_from_api
 
 def is_valid_youtube_url(url: str) -> bool:
     if not isinstance(url, str):
@@ -17,111 +17,65 @@ def is_valid_youtube_url(url: str) -> bool:
         pattern = r"^https://www\.youtube\.com/shorts/[A-Za-z0-9_-]{11}$"
     return re.match(pattern, url) is not None
 
-def get_video_title(video_id: str) -> str:
-    """Use yt-dlp to extract the video title from YouTube."""
-    ydl_opts = {
-        'quiet': True,
-        'skip_download': True,
-        'extract_flat': True,
-    }
-    url = f"https://www.youtube.com/watch?v={video_id}"
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        try:
-            info = ydl.extract_info(url, download=False)
-            return info.get("title", f"Video {video_id}")
-        except Exception:
-            return f"Video {video_id}"
+def get_video_title(video_id: str, cookies: str = "") -> str:
+    """Returns the video title from the shared (cached) yt-dlp metadata."""
+    try:
+        return extract_video_info(video_id, cookies).get("title", f"Video {video_id}")
+    except Exception:
+        return f"Video {video_id}"
 
-def get_subtitles_with_yt_dlp(video_url: str) -> str:
+def get_subtitles_with_yt_dlp(video_url: str, cookies: str = "", log=print, info: dict | None = None) -> list | None:
     """
     Attempt to fetch subtitles (captions) using yt-dlp.
-    Returns a plain text transcript if available, or an empty string otherwise.
-    This version supports attaching cookies (if provided in st.session_state.youtube_cookies)
-    via the 'cookiefile' option.
+    Returns the transcript as a list of Segments (start, duration, text),
+    streamed from the caption file (json3, VTT or SRT) with cue markup and
+    rolling auto-caption repeats removed; [] if the video has no caption
+    track, or None if that could not be checked (the metadata extraction or
+    the caption download failed).
+    Reuses an already extracted info dict when given; otherwise the video's
+    metadata is extracted (or taken from the cache) with cookies attached.
+    Warnings go to log.
     """
-    # Base options.
-    ydl_opts = {
-        'skip_download': True,
-        'writesubtitles': True,         # try to get manually provided subtitles
-        'writeautomaticsub': True,      # fallback to auto-generated subtitles if needed
-        'subtitleslangs': ['en', 'es'],  # try English or Spanish (adjust as needed)
-        'extract_flat': False,
-        'quiet': True,
-    }
-    
-    # If cookies are present in session state, attach them.
-    cookies = st.session_state.get("youtube_cookies", "").strip()
-    if cookies:
+    if info is None:
         try:
-            cookie_file = tempfile.NamedTemporaryFile(delete=False, suffix=".txt")
-            cookie_file.write(cookies.encode("utf-8"))
-            cookie_file.close()
-            ydl_opts["cookiefile"] = cookie_file.name
-            st.write("DEBUG: Attached cookie file for transcript extraction:", cookie_file.name)
-        except Exception as ce:
-            st.warning(f"Failed to attach cookies: {ce}")
-    
-    try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(video_url, download=False)
-    except Exception as e:
-        st.warning(f"yt-dlp extraction failed for fallback: {e}")
-        return ""
+            info = extract_video_info(canonical_video_id(video_url), cookies)
+        except Exception as e:
+            log(f"yt-dlp extraction failed for fallback: {e}")
+            return None
     
     # Look for subtitles in the extracted info.
-    subtitles = info.get("subtitles", {})
-    automatic_captions = info.get("automatic_captions", {})
-    subtitle_url = None
-    if 'en' in subtitles:
-        subtitle_url = subtitles['en'][0]['url']
-    elif 'en' in automatic_captions:
-        subtitle_url = automatic_captions['en'][0]['url']
-    elif subtitles:
-        first_lang = next(iter(subtitles))
-        subtitle_url = subtitles[first_lang][0]['url']
-    elif automatic_captions:
-        first_lang = next(iter(automatic_captions))
-        subtitle_url = automatic_captions[first_lang][0]['url']
+    subtitle_url = select_subtitle_url(info)
     
     if subtitle_url:
         try:
-            r = requests.get(subtitle_url)
-            if not r.ok:
-                return ""
-            text = r.text
-            # If the response is JSON, parse it.
-            if text.lstrip().startswith('{'):
-                try:
-                    data = json.loads(text)
-                    if "events" in data:
-                        transcript_lines = []
-                        for event in data["events"]:
-                            segs = event.get("segs", [])
-                            line = "".join(seg.get("utf8", "") for seg in segs)
-                            if line.strip():
-                                transcript_lines.append(line.strip())
-                        return "\n".join(transcript_lines)
-                except Exception as je:
-                    st.warning(f"Failed to parse JSON subtitles: {je}")
-                    # Fall through to VTT processing.
-            # Otherwise, assume VTT and perform minimal processing.
-            lines = text.splitlines()
-            transcript_lines = []
-            for line in lines:
-                if "-->" in line:
-                    continue
-                if line.strip() == "" or "WEBVTT" in line:
-                    continue
-                transcript_lines.append(line)
-            return "\n".join(transcript_lines)
+            with rate_limited(YOUTUBE_HOST) as request:
+                with requests.get(subtitle_url, stream=True) as r:
+                    if r.status_code == 429:
+                        request.on_throttle()
+                    if not r.ok:
+                        log(f"Failed to download subtitles via yt-dlp: HTTP {r.status_code}")
+                        return None
+                    return list(normalize_segments(iter_response_segments(r)))
         except Exception as e:
-            st.warning(f"Failed to download subtitles via yt-dlp: {e}")
-            return ""
-    return ""
+            log(f"Failed to download subtitles via yt-dlp: {e}")
+            return None
+    return []
+
+def _fetch_api_transcript(video_id: str):
+    # youtube-transcript-api 0.x has a static get_transcript; 1.x fetches through an instance.
+    languages = ['en', 'es', 'auto']
+    if hasattr(YouTubeTranscriptApi, "get_transcript"):
+        return YouTubeTranscriptApi.get_transcript(video_id, languages=languages)
+    return YouTubeTranscriptApi().fetch(video_id, languages=languages)
 
-def get_single_transcript(youtube_url: str) -> dict:
+def get_single_transcript(youtube_url: str, cookies: str = "", log=print) -> dict:
+    """
+    Fetches title and transcript for one URL; warnings go to log. Makes no
+    Streamlit calls, so it is safe in worker threads and outside the app.
+    On success "transcript" is a list of Segments, whichever source supplied it.
+    """
     if not is_valid_youtube_url(youtube_url):
-        st.error(f"Invalid URL: {youtube_url}")
+        log(f"Invalid URL: {youtube_url}")
         return {
             "youtube_url": youtube_url,
             "video_id": None,
@@ -129,16 +83,23 @@ def get_single_transcript(youtube_url: str) -> dict:
             "transcript": "Invalid URL format."
         }
     # Extract video ID.
-    video_id = youtube_url.split("/")[-1] if "shorts" in youtube_url else youtube_url.split("=")[-1]
-    # Get the video title.
-    video_title = get_video_title(video_id)
+    video_id = canonical_video_id(youtube_url)
+    # One metadata extraction serves both the title and the subtitle fallback.
+    try:
+        info = extract_video_info(video_id, cookies)
+    except Exception as e:
+        log(f"Metadata extraction failed for {youtube_url}: {e}")
+        info = None
+    video_title = info.get("title", f"Video {video_id}") if info else f"Video {video_id}"
     
+    # Retries are paced by the shared per-host rate limiter, which also backs
+    # off (for every caller) when YouTube starts throttling.
     max_retries = 5
-    delay = 1  # initial delay in seconds
     for attempt in range(max_retries):
         try:
             # Try using the YouTubeTranscriptApi first.
-            transcript = YouTubeTranscriptApi.get_transcript(video_id, languages=['en', 'es', 'auto'])
+            with rate_limited(YOUTUBE_HOST):
+                transcript = segments_from_api(_fetch_api_transcript(video_id))
             return {
                 "youtube_url": youtube_url,
                 "video_id": video_id,
@@ -147,7 +108,7 @@ def get_single_transcript(youtube_url: str) -> dict:
             }
         except (TranscriptsDisabled, NoTranscriptFound) as e:
             # Fallback to yt-dlp method, which now attaches cookies if available.
-            fallback_transcript = get_subtitles_with_yt_dlp(youtube_url)
+            fallback_transcript = get_subtitles_with_yt_dlp(youtube_url, cookies=cookies, log=log, info=info)
             if fallback_transcript:
                 return {
                     "youtube_url": youtube_url,
@@ -155,17 +116,27 @@ def get_single_transcript(youtube_url: str) -> dict:
                     "video_title": video_title,
                     "transcript": fallback_transcript,
                 }
+            elif fallback_transcript is None:
+                # The captions could not be checked (e.g. the extraction was
+                # throttled); not cached as missing, so the next run retries.
+                return {
+                    "youtube_url": youtube_url,
+                    "video_id": video_id,
+                    "video_title": video_title,
+                    "transcript": "Failed to retrieve transcript: the captions could not be checked.",
+                }
             else:
+                # missing_reason marks the entry for the negative cache; the text is for display only.
                 return {
                     "youtube_url": youtube_url,
                     "video_id": video_id,
                     "video_title": video_title,
-                    "transcript": f"Transcript not available: {e}"
+                    "transcript": f"Transcript not available: {e}",
+                    "missing_reason": type(e).__name__,
                 }
         except Exception as e:
-            st.warning(f"Attempt {attempt+1} for {youtube_url} failed: {e}")
-            time.sleep(delay)
-            delay *= 2  # exponential backoff
+            reason = "throttled" if is_throttle_error(e) else "failed"
+            log(f"Attempt {attempt+1} for {youtube_url} {reason}: {e}")
     return {
         "youtube_url": youtube_url,
         "video_id": video_id,
@@ -173,13 +144,40 @@ def get_single_transcript(youtube_url: str) -> dict:
         "transcript": "Failed to retrieve transcript after multiple attempts."
     }
 
-def get_batch_transcripts(youtube_urls: List[str]) -> List[Dict]:
-    entries = []
-    for url in youtube_urls:
-        sanitized_url = url.strip()
-        if not sanitized_url:
-            continue
-        entry = get_single_transcript(sanitized_url)
-        if entry is not None:
-            entries.append(entry)
-    return entries
+def _fetch_in_worker(youtube_url: str, cookies: str) -> tuple:
+    messages = []
+    try:
+        entry = get_single_transcript(youtube_url, cookies=cookies, log=messages.append)
+    except Exception as e:
+        messages.append(f"Fetching {youtube_url} failed: {e}")
+        entry = {
+            "youtube_url": youtube_url,
+            "video_id": None,
+            "video_title": "Unknown Title",
+            "transcript": f"Failed to retrieve transcript: {e}",
+        }
+    return entry, messages
+
+def iter_transcripts_concurrently(youtube_urls: List[str], max_workers: int = default_max_workers, cookies: str = ""):
+    """
+    Fetches transcripts on a pool of max_workers threads and yields
+    (youtube_url, entry, messages) as each one completes, so the calling
+    (Streamlit script) thread can keep updating the UI and persisting results.
+    Pending fetches are cancelled if the caller stops iterating.
+    """
+    executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="transcript-fetch")
+    try:
+        futures = {executor.submit(_fetch_in_worker, url, cookies): url for url in youtube_urls}
+        for future in as_completed(futures):
+            entry, messages = future.result()
+            yield futures[future], entry, messages
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def get_batch_transcripts(youtube_urls: List[str], max_workers: int = default_max_workers, cookies: str = "") -> List[Dict]:
+    sanitized_urls = [url.strip() for url in youtube_urls if url.strip()]
+    entries = {}
+    for url, entry, _ in iter_transcripts_concurrently(sanitized_urls, max_workers, cookies):
+        entries[url] = entry
+    # Keep the input order regardless of completion order.
+    return [entries[url] for url in sanitized_urls if url in entries]
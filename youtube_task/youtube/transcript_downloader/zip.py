@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from zipfile import ZIP_DEFLATED
+from persistence import iter_transcripts, load_channel_fingerprints
+from export import EXPORT_DIR
+
+# The "Download ZIP" export is built only when requested and cached on disk.
+# Each channel's members are compressed once and kept as a fragment (raw
+# deflate data plus an index) keyed by the channel's fingerprint, so after a
+# change only the affected channels are recompressed; the archive itself is
+# assembled by copying the fragments, never held in memory.
+COMPRESSION_LEVEL = 6
+COPY_CHUNK_SIZE = 1024 * 1024
+# Outdated archives and fragments are only removed once unused for this long:
+# another session or process may have just built or reused one and be about
+# to read it. Reusing a file refreshes its modification time.
+STALE_EXPORT_GRACE_SECONDS = 10 * 60
+
+_build_lock = threading.Lock()
+
+def _safe_title(title: str) -> str:
+    return "".join(c if c.isalnum() else "_" for c in title).strip()
+
+def _dos_datetime(timestamp: float) -> tuple:
+    t = time.localtime(timestamp)
+    return (
+        (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2),
+        ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday,
+    )
+
+def _atomic_write(path: str, write) -> None:
+    # Same pattern as the blob store: readers never see a partial file.
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def _fragment_paths(fingerprint: str) -> tuple:
+    base = os.path.join(EXPORT_DIR, "channels", fingerprint)
+    return base + ".deflate", base + ".json"
+
+def _build_fragment(channel: str, fingerprint: str) -> list:
+    """Compresses one channel's transcripts; returns its member index."""
+    data_path, index_path = _fragment_paths(fingerprint)
+    if os.path.exists(index_path) and os.path.exists(data_path):
+        with open(index_path, "r") as f:
+            members = json.load(f)
+        os.utime(data_path)
+        os.utime(index_path)
+        return members
+    os.makedirs(os.path.dirname(data_path), exist_ok=True)
+    members = []
+    names = set()
+
+    def write(f):
+        for _, video_id, title, text in iter_transcripts(channel=channel):
+            name = f"{channel}/{_safe_title(title)}.txt"
+            if name in names:
+                name = f"{channel}/{_safe_title(title)}_{video_id}.txt"
+            names.add(name)
+            data = text.encode("utf-8")
+            compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, -15)
+            compressed = compressor.compress(data) + compressor.flush()
+            members.append([name, zlib.crc32(data), len(data), len(compressed), f.tell()])
+            f.write(compressed)
+
+    _atomic_write(data_path, write)
+    _atomic_write(index_path, lambda f: f.write(json.dumps(members).encode("utf-8")))
+    return members
+
+def _write_archive(out, fragments: list, timestamp: float) -> None:
+    mtime, mdate = _dos_datetime(timestamp)
+    flags = 0x800  # UTF-8 file names
+    central = []
+    for fingerprint, members in fragments:
+        data_path, _ = _fragment_paths(fingerprint)
+        with open(data_path, "rb") as data:
+            for name, crc, size, compressed_size, position in members:
+                encoded = name.encode("utf-8")
+                offset = out.tell()
+                out.write(struct.pack(
+                    "<IHHHHHIIIHH", 0x04034B50, 20, flags, ZIP_DEFLATED, mtime, mdate,
+                    crc, compressed_size, size, len(encoded), 0,
+                ))
+                out.write(encoded)
+                data.seek(position)
+                remaining = compressed_size
+                while remaining:
+                    chunk = data.read(min(COPY_CHUNK_SIZE, remaining))
+                    out.write(chunk)
+                    remaining -= len(chunk)
+                central.append((encoded, crc, size, compressed_size, offset))
+    directory_offset = out.tell()
+    for encoded, crc, size, compressed_size, offset in central:
+        extra = b""
+        if offset >= 0xFFFFFFFF:
+            extra = struct.pack("<HHQ", 0x0001, 8, offset)
+        out.write(struct.pack(
+            "<IHHHHHHIIIHHHHHII", 0x02014B50, 45, 45 if extra else 20, flags, ZIP_DEFLATED,
+            mtime, mdate, crc, compressed_size, size, len(encoded), len(extra), 0, 0, 0,
+            0o644 << 16, min(offset, 0xFFFFFFFF),
+        ))
+        out.write(encoded)
+        out.write(extra)
+    directory_size = out.tell() - directory_offset
+    count = len(central)
+    if count >= 0xFFFF or directory_offset >= 0xFFFFFFFF or directory_size >= 0xFFFFFFFF:
+        # ZIP64 end of central directory record and locator
+        zip64_offset = out.tell()
+        out.write(struct.pack(
+            "<IQHHIIQQQQ", 0x06064B50, 44, 45, 45, 0, 0, count, count, directory_size, directory_offset,
+        ))
+        out.write(struct.pack("<IIQI", 0x07064B50, 0, zip64_offset, 1))
+    out.write(struct.pack(
+        "<IHHHHIIH", 0x06054B50, 0, 0, min(count, 0xFFFF), min(count, 0xFFFF),
+        min(directory_size, 0xFFFFFFFF), min(directory_offset, 0xFFFFFFFF), 0,
+    ))
+
+def build_transcripts_zip() -> str:
+    """
+    Returns the path of a ZIP with every stored transcript as
+    <channel>/<title>.txt, reusing the cached archive and channel fragments
+    for whatever has not changed since the last export.
+    """
+    with _build_lock:
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        fingerprints = load_channel_fingerprints()
+        overall = hashlib.sha256(json.dumps(sorted(fingerprints.items())).encode("utf-8")).hexdigest()
+        zip_path = os.path.join(EXPORT_DIR, f"transcripts-{overall}.zip")
+        if not os.path.exists(zip_path):
+            fragments = [
+                (fingerprint, _build_fragment(channel, fingerprint))
+                for channel, fingerprint in fingerprints.items()
+            ]
+            print("INFO: writing transcript export", zip_path)
+            _atomic_write(zip_path, lambda f: _write_archive(f, fragments, time.time()))
+        else:
+            os.utime(zip_path)
+        _remove_stale_exports(set(fingerprints.values()), zip_path)
+        return zip_path
+
+def read_transcripts_zip() -> bytes:
+    """Reads build_transcripts_zip()'s archive, closing the file (st.download_button never does)."""
+    with open(build_transcripts_zip(), "rb") as f:
+        return f.read()
+
+def _remove_if_unused(path: str, cutoff: float) -> None:
+    try:
+        if os.path.getmtime(path) < cutoff:
+            os.remove(path)
+    except FileNotFoundError:
+        # Removed by another process meanwhile
+        pass
+
+def _remove_stale_exports(fingerprints: set, zip_path: str) -> None:
+    # ".tmp" files may be exports another process is still writing.
+    cutoff = time.time() - STALE_EXPORT_GRACE_SECONDS
+    for name in os.listdir(EXPORT_DIR):
+        path = os.path.join(EXPORT_DIR, name)
+        if name.startswith("transcripts-") and name.endswith(".zip") and path != zip_path:
+            _remove_if_unused(path, cutoff)
+    channels_dir = os.path.join(EXPORT_DIR, "channels")
+    if os.path.isdir(channels_dir):
+        for name in os.listdir(channels_dir):
+            if not name.endswith(".tmp") and name.split(".")[0] not in fingerprints:
+                _remove_if_unused(os.path.join(channels_dir, name), cutoff)
@@ -1,6 +1,15 @@
+import os
 import streamlit as st
-from video_downloader.config import video_choices
-from video_downloader.callbacks import callback_download_video
+from storage import in_use
+from video_downloader.config import video_choices, default_download_workers
+from video_downloader.callbacks import (
+    QUEUE_COLUMN_CONFIG,
+    callback_download_video,
+    download_queue,
+    queue_archive,
+    queue_frame,
+    queue_urls,
+)
 from video_downloader.state import state_init, default_clip_video_path
 
 def app():
@@ -97,15 +106,55 @@ def app():
         and st.session_state.youtube_download_location != default_clip_video_path
     ):
         st.markdown("### ✅ Download Ready")
-        # First show the video preview...
-        st.video(st.session_state.youtube_download_location, format="video/mp4")
-        # ...and then the download button below the video.
-        with open(st.session_state.youtube_download_location, "rb") as file:
+        location = st.session_state.youtube_download_location
+        if not os.path.exists(location):
+            st.info("This video was removed from the media cache to free disk space. Download it again to view it.")
+        else:
+            # Not evicted while it is read for the preview and the button
+            with in_use(location):
+                # First show the video preview...
+                st.video(location, format="video/mp4")
+                # ...and then the download button below the video.
+                with open(location, "rb") as file:
+                    st.download_button(
+                        label="📥 Download Video",
+                        data=file,
+                        file_name=location.split("/")[-1],
+                        mime="video/mp4",
+                        type="primary",
+                        key="button-download",
+                    )
+
+    # Download queue: many videos in parallel, e.g. a whole channel listing
+    st.markdown("---")
+    st.markdown("### 📦 Download Queue")
+    st.write("Queue a list of URLs or a channel listing exported from the Channel Downloader.")
+    queue_text = st.text_area("YouTube URLs (comma or newline separated)", key="download_queue_text")
+    queue_file = st.file_uploader(
+        "...or upload a URL list (.txt) or channel listing (.csv)", type=["txt", "csv"], key="download_queue_file"
+    )
+    queue_workers = st.slider("Parallel downloads", min_value=1, max_value=16, value=default_download_workers)
+    if st.button("📦 Download All", key="download_queue_button"):
+        try:
+            urls = queue_urls(queue_file, queue_text)
+        except ValueError as e:
+            st.error(str(e))
+        else:
+            if urls:
+                download_queue(urls, resolution_dropdown, queue_workers)
+            else:
+                st.error("No YouTube URLs were provided.")
+
+    rows = st.session_state.download_queue_rows
+    if rows:
+        downloaded = sum(row["status"] == "done" for row in rows.values())
+        st.write(f"{downloaded} of {len(rows)} videos downloaded; failures are listed with their error.")
+        st.dataframe(queue_frame(rows), column_config=QUEUE_COLUMN_CONFIG)
+        if downloaded:
             st.download_button(
-                label="📥 Download Video",
-                data=file,
-                file_name=st.session_state.youtube_download_location.split("/")[-1],
-                mime="video/mp4",
-                type="primary",
-                key="button-download",
+                label="📥 Download All Videos (.zip)",
+                data=lambda: queue_archive(rows),
+                file_name="videos.zip",
+                mime="application/zip",
+                key="download_queue_archive",
             )
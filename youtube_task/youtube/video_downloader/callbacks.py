@@ -1,8 +1,20 @@
+import os
+import re
+import tempfile
+import time
+import zipfile
+import pandas as pd
 import streamlit as st
-from video_downloader.yt_download import download_video
-from video_downloader.state import default_youtube_download_location
-from video_downloader.config import video_choices
-from persistence import load_persistent_state, save_persistent_state
+from video_downloader.yt_download import download_video, iter_downloads_concurrently, record_download_failure
+from video_downloader.config import video_choices, default_download_workers, default_queue_refresh_seconds
+from metadata import canonical_video_id, video_url
+from persistence import load_persistent_state, set_state_value, flush_persistent_state
+from storage import in_use, request_eviction
+from export import EXPORT_DIR
+
+URL_SEPARATOR_PATTERN = re.compile(r"[\s,]+")
+# Queue rows show their download progress as a bar
+QUEUE_COLUMN_CONFIG = {"progress": st.column_config.ProgressColumn("progress", min_value=0.0, max_value=1.0)}
 
 def callback_download_video(url_input: str, resolution_dropdown: str) -> None:
     # Reset progress display in session state
@@ -10,10 +22,10 @@ def callback_download_video(url_input: str, resolution_dropdown: str) -> None:
     st.session_state.download_status = "Starting download..."
 
     # Initialize persistent progress for this download (for a single file, total = 1)
-    persistent_state = st.session_state.get("persistent_state", load_persistent_state())
+    persistent_state = st.session_state.get("persistent_state") or load_persistent_state(include_transcripts=False)
     persistent_state["download_progress"]["total"] = 1
     persistent_state["download_progress"]["downloaded"] = 0
-    save_persistent_state(persistent_state)
+    set_state_value("download_progress", persistent_state["download_progress"])
     st.session_state.persistent_state = persistent_state
 
     # Create a progress bar and a status text placeholder.
@@ -23,7 +35,6 @@ def callback_download_video(url_input: str, resolution_dropdown: str) -> None:
     # Download the video with progress tracking.
     temporary_video_location = download_video(
         url_input,
-        default_youtube_download_location(),
         resolution_dropdown,
         progress_bar,
         status_text
@@ -31,10 +42,122 @@ def callback_download_video(url_input: str, resolution_dropdown: str) -> None:
 
     # Update persistent state when the download is successful.
     persistent_state["download_progress"]["downloaded"] = 1
-    save_persistent_state(persistent_state)
+    set_state_value("download_progress", persistent_state["download_progress"])
 
     # Store the download location and selected resolution index in session state.
     st.session_state.youtube_download_location = temporary_video_location
     st.session_state.youtube_download_resolution_index = video_choices.index(resolution_dropdown)
     st.session_state.download_status = "✅ Download complete!"
     st.session_state.download_progress = 1.0
+
+def queue_urls(uploaded_file, text_urls: str) -> list:
+    """
+    The URLs to queue, from the text box (comma and/or whitespace separated)
+    and an uploaded URL list (.txt) or channel listing (.csv with a
+    youtube_url or video_id column). Video URLs are queued in their
+    canonical watch?v= form and repeats of a video are dropped. Raises
+    ValueError for a CSV without either column.
+    """
+    urls = [url for url in URL_SEPARATOR_PATTERN.split(text_urls or "") if url]
+    if uploaded_file is not None:
+        if uploaded_file.name.lower().endswith(".csv"):
+            listing = pd.read_csv(uploaded_file, dtype=str)
+            if "youtube_url" in listing.columns:
+                urls.extend(listing["youtube_url"].dropna())
+            elif "video_id" in listing.columns:
+                urls.extend(video_url(video_id) for video_id in listing["video_id"].dropna())
+            else:
+                raise ValueError(f"{uploaded_file.name} has no youtube_url or video_id column")
+        else:
+            content = uploaded_file.read().decode("utf-8")
+            urls.extend(url for url in URL_SEPARATOR_PATTERN.split(content) if url)
+    # One entry per video, in canonical form; URLs that are not videos are kept
+    # as given so they show up as failures.
+    unique = {}
+    for url in map(str.strip, urls):
+        video_id = canonical_video_id(url)
+        unique.setdefault(video_id or url, video_url(video_id) if video_id else url)
+    return list(unique.values())
+
+def queue_frame(rows: dict) -> pd.DataFrame:
+    return pd.DataFrame(list(rows.values()), columns=["youtube_url", "status", "progress", "detail"])
+
+def download_queue(urls: list, resolution_dropdown: str, max_workers: int = default_download_workers) -> None:
+    """
+    Downloads urls with max_workers parallel workers while showing one
+    progress row per video and the overall progress. Failures are recorded in
+    failed_downloads and the queue carries on. Videos already in the media
+    cache finish at once. The rows are kept in session state for the results
+    section.
+    """
+    rows = {url: {"youtube_url": url, "status": "queued", "progress": 0.0, "detail": ""} for url in urls}
+
+    # Persistent totals for the whole queue
+    persistent_state = st.session_state.get("persistent_state") or load_persistent_state(include_transcripts=False)
+    progress = {"total": len(urls), "downloaded": 0, "failed": 0}
+    persistent_state["download_progress"] = progress
+    set_state_value("download_progress", progress)
+    st.session_state.persistent_state = persistent_state
+
+    progress_bar = st.progress(0)
+    status_text = st.empty()
+    table = st.empty()
+    last_drawn = 0.0
+    cookies = st.session_state.get("youtube_cookies", "")
+    for url, event, value in iter_downloads_concurrently(urls, resolution_dropdown, max_workers, cookies):
+        row = rows[url]
+        if event == "progress":
+            row.update(status="downloading", progress=value)
+        elif event == "info":
+            row["detail"] = value
+        elif event == "done":
+            row.update(status="done", progress=1.0, detail=os.path.basename(value), path=value)
+            progress["downloaded"] += 1
+        else:
+            row.update(status="failed", detail=value)
+            record_download_failure(url, value)
+            progress["failed"] += 1
+        if event in ("done", "failed"):
+            # Earlier items may have left their grace period by now; a long
+            # queue should not wait for the timer to come back under quota.
+            request_eviction()
+            set_state_value("download_progress", progress)
+            finished = progress["downloaded"] + progress["failed"]
+            progress_bar.progress(finished / len(urls))
+            status_text.write(
+                f"{finished}/{len(urls)} finished: {progress['downloaded']} downloaded, {progress['failed']} failed"
+            )
+        # Redraw the per-video rows at most every default_queue_refresh_seconds
+        if time.monotonic() - last_drawn >= default_queue_refresh_seconds:
+            table.dataframe(queue_frame(rows), column_config=QUEUE_COLUMN_CONFIG)
+            last_drawn = time.monotonic()
+    table.empty()
+    flush_persistent_state()
+
+    st.session_state.download_queue_rows = rows
+
+def queue_archive(rows: dict):
+    """
+    Zips the videos the queue downloaded, one folder per video ID so equal
+    titles do not collide, and returns the archive opened for reading (like
+    export.export_file). Entries are stored, as MP4 is already compressed.
+    Videos evicted from the media cache since the queue ran are left out.
+    """
+    paths = [row["path"] for row in rows.values() if row["status"] == "done"]
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    fd, archive_path = tempfile.mkstemp(dir=EXPORT_DIR, suffix=".zip.tmp")
+    try:
+        with os.fdopen(fd, "wb") as archive_file, in_use(*paths):
+            with zipfile.ZipFile(archive_file, "w", zipfile.ZIP_STORED, allowZip64=True) as archive:
+                for row in rows.values():
+                    if row["status"] == "done" and os.path.exists(row["path"]):
+                        arcname = f"{canonical_video_id(row['youtube_url'])}/{os.path.basename(row['path'])}"
+                        archive.write(row["path"], arcname=arcname)
+        return open(archive_path, "rb")
+    finally:
+        try:
+            # Gone once the reader is closed
+            os.remove(archive_path)
+        except OSError:
+            # Windows cannot remove an open file; it stays in EXPORT_DIR.
+            pass
@@ -2,3 +2,7 @@ app_name = "Youtube Task"
 video_choices = ["best", "1080", "720", "360"]
 default_clip_video_path = "data/input/blank.mp4"
 default_clip_gif_path = "data/input/blank.jpg"
+# Videos downloaded in parallel by the download queue.
+default_download_workers = 4
+# The download queue redraws its per-video progress rows at most this often.
+default_queue_refresh_seconds = 0.5
@@ -1,98 +1,167 @@
-import yt_dlp
-from yt_dlp import YoutubeDL
 import re
 import os
+import queue
+from concurrent.futures import ThreadPoolExecutor
 import streamlit as st
-from video_downloader.state import default_youtube_download_location
-from persistence import load_persistent_state, save_persistent_state
-import tempfile
+from video_downloader.config import default_download_workers
+from persistence import load_persistent_state, record_failed_download
+from metadata import extract_video_info, download_from_info, cookiefile_for, canonical_video_id
+from media_cache import media_dir, media_entry_lock, cached_media, partial_media, add_media
 
-def is_valid_youtube_url(url: str) -> bool:
-    if not isinstance(url, str):
-        return False
-    pattern = r"^https://www\.youtube\.com/watch\?v=[A-Za-z0-9_-]{11}$"
-    if "shorts" in url:
-        pattern = r"^https://www\.youtube\.com/shorts/[A-Za-z0-9_-]{11}$"
-    return re.match(pattern, url) is not None
+def format_selector(resolution_dropdown: str) -> str:
+    """The yt-dlp format selector for a resolution choice (see config.video_choices)."""
+    # Apply resolution filters if specified.
+    if resolution_dropdown in ("1080", "720", "360"):
+        return f"best[height<={resolution_dropdown}][ext=mp4]"
+    return "best[ext=mp4]"
 
-def download_video(url: str, savedir: str, resolution_dropdown: str, progress_bar, status_text, my_proxies: dict = {}) -> str:
-    try:
-        print("Downloading video from YouTube...")
-        if not is_valid_youtube_url(url):
-            raise ValueError(f"Invalid input URL: {url}")
+def _download_once(video_id: str, selector: str, progress_hook, cookies: str = "", refresh: bool = False) -> str:
+    # One extraction (possibly cached) provides the title and drives the download.
+    info_dict = extract_video_info(video_id, cookies, refresh=refresh)
+
+    # Continue an interrupted download under its original name, else name the file after the title.
+    savepath = partial_media(video_id, selector)
+    if savepath is None:
+        video_title = re.sub(r"[^a-zA-Z0-9]", " ", info_dict.get("title") or "")
+        savepath = os.path.join(media_dir(video_id, selector), f"{video_title or video_id}.mp4")
 
-        # Extract video info without downloading.
-        with YoutubeDL() as ydl:
-            info_dict = ydl.extract_info(url, download=False)
-            video_id = info_dict.get("id", None)
-            video_title = info_dict.get("title", None)
-            video_title = re.sub(r"[^a-zA-Z0-9]", " ", video_title)
-        
-        # Construct a save path.
-        savepath = os.path.join(savedir, f"{video_title or video_id}.mp4")
-        
-        def my_progress_hook(d):
-            if d.get('status') == 'downloading':
-                total_bytes = d.get('total_bytes') or d.get('total_bytes_estimate')
-                downloaded_bytes = d.get('downloaded_bytes', 0)
-                if total_bytes:
-                    progress = downloaded_bytes / total_bytes
-                    progress_bar.progress(progress)
-                    percentage = int(progress * 100)
-                    status_text.text(f"Downloading... {percentage}%")
-            elif d.get('status') == 'finished':
-                progress_bar.progress(1.0)
-                status_text.text("✅ Download completed!")
-        
-        # Set yt-dlp options.
-        ydl_opts = {
-            "format": "best[ext=mp4]",
-            "outtmpl": savepath,
-            "progress_hooks": [my_progress_hook],
-            "noplaylist": True,
-            "postprocessors": [],
-        }
-        # Apply resolution filters if specified.
-        if resolution_dropdown == "1080":
-            ydl_opts["format"] = "best[height<=1080][ext=mp4]"
-        elif resolution_dropdown == "720":
-            ydl_opts["format"] = "best[height<=720][ext=mp4]"
-        elif resolution_dropdown == "360":
-            ydl_opts["format"] = "best[height<=360][ext=mp4]"
-        
+    # Set yt-dlp options.
+    ydl_opts = {
+        "format": selector,
+        "outtmpl": savepath,
+        "progress_hooks": [progress_hook],
+        "noplaylist": True,
+        "postprocessors": [],
+        # Resume from an existing .part file
+        "continuedl": True,
+    }
+    cookiefile = cookiefile_for(cookies)
+    if cookiefile:
+        ydl_opts["cookiefile"] = cookiefile
+
+    download_from_info(info_dict, ydl_opts)
+    return savepath
+
+def _download_with_retries(video_id: str, selector: str, progress_hook, cookies: str, log) -> str:
+    try:
         # Attempt the download.
-        with YoutubeDL(ydl_opts) as ydl:
-            ydl.download([url])
-        
+        try:
+            return _download_once(video_id, selector, progress_hook)
+        except Exception as e:
+            if "signin" in str(e).lower():
+                raise
+            # The cached metadata may hold expired media URLs; extract afresh once.
+            return _download_once(video_id, selector, progress_hook, refresh=True)
+    except Exception as e:
+        if "signin" not in str(e).lower() or not cookies.strip():
+            raise
+        log("Detected signin error, retrying with cookies...")
+        return _download_once(video_id, selector, progress_hook, cookies=cookies, refresh=True)
+
+def fetch_video(url: str, resolution_dropdown: str, progress_hook, cookies: str = "", log=print) -> str:
+    """
+    Returns the path of the video in the media cache (media_cache.py),
+    downloading it first unless it is already there, without touching the
+    UI. A failed download is retried once with fresh metadata, or with
+    cookies (if given) when YouTube asks to sign in. Any single-video URL
+    form is accepted (see metadata.canonical_video_id). Raises ValueError for
+    an invalid URL and whatever yt-dlp raises otherwise.
+    """
+    video_id = canonical_video_id(url)
+    if video_id is None:
+        raise ValueError(f"Invalid input URL: {url}")
+    selector = format_selector(resolution_dropdown)
+    with media_entry_lock(video_id, selector):
+        savepath = cached_media(video_id, selector)
+        if savepath is not None:
+            log("✅ Already downloaded, served from the media cache.")
+            progress_hook({"status": "finished", "filename": savepath})
+            return savepath
+        savepath = _download_with_retries(video_id, selector, progress_hook, cookies, log)
+        return add_media(video_id, selector, savepath)
+
+def record_download_failure(url: str, error: str) -> None:
+    """Logs a failed download to data/download_errors.log and to failed_downloads."""
+    with open("data/download_errors.log", "a") as log_file:
+        log_file.write(f"Download failed for {url}: {error}\n")
+    persistent_state = st.session_state.get("persistent_state") or load_persistent_state(include_transcripts=False)
+    if "failed_downloads" not in persistent_state:
+        persistent_state["failed_downloads"] = []
+    persistent_state["failed_downloads"].append({"url": url, "error": error})
+    record_failed_download(url, error)
+
+def download_video(url: str, resolution_dropdown: str, progress_bar, status_text, my_proxies: dict = {}) -> str:
+    def my_progress_hook(d):
+        if d.get('status') == 'downloading':
+            total_bytes = d.get('total_bytes') or d.get('total_bytes_estimate')
+            downloaded_bytes = d.get('downloaded_bytes', 0)
+            if total_bytes:
+                progress = downloaded_bytes / total_bytes
+                progress_bar.progress(progress)
+                percentage = int(progress * 100)
+                status_text.text(f"Downloading... {percentage}%")
+        elif d.get('status') == 'finished':
+            progress_bar.progress(1.0)
+            status_text.text("✅ Download completed!")
+
+    try:
+        print("Downloading video from YouTube...")
+        savepath = fetch_video(
+            url,
+            resolution_dropdown,
+            my_progress_hook,
+            cookies=st.session_state.get("youtube_cookies", ""),
+            log=status_text.text,
+        )
         print("✅ Download complete!")
         return savepath
-
     except Exception as e:
-        error_msg = f"Download failed for {url}: {e}"
-        # Check if the error message indicates a signin problem and if we have cookies.
-        if "signin" in str(e).lower() and st.session_state.get("youtube_cookies", "").strip():
-            status_text.text("Detected signin error, retrying with cookies...")
-            # Write cookies from session state to a temporary file.
-            cookie_file = tempfile.NamedTemporaryFile(delete=False, suffix=".txt")
-            cookie_file.write(st.session_state.youtube_cookies.encode("utf-8"))
-            cookie_file.close()
-            # Add the cookie file option.
-            ydl_opts["cookiefile"] = cookie_file.name
-            try:
-                with YoutubeDL(ydl_opts) as ydl:
-                    ydl.download([url])
-                status_text.text("✅ Download completed with cookies!")
-                return savepath
-            except Exception as e2:
-                error_msg = f"Retry with cookies failed for {url}: {e2}"
-        # Log error to a file.
-        with open("data/download_errors.log", "a") as log_file:
-            log_file.write(error_msg + "\n")
-        # Update persistent state.
-        persistent_state = st.session_state.get("persistent_state", load_persistent_state())
-        if "failed_downloads" not in persistent_state:
-            persistent_state["failed_downloads"] = []
-        persistent_state["failed_downloads"].append({"url": url, "error": str(e)})
-        save_persistent_state(persistent_state)
-        status_text.text(error_msg)
+        record_download_failure(url, str(e))
+        status_text.text(f"Download failed for {url}: {e}")
         raise
+
+def _download_in_worker(url: str, resolution_dropdown: str, cookies: str, events: queue.Queue) -> None:
+    last_percent = -1
+
+    def progress_hook(d):
+        nonlocal last_percent
+        total_bytes = d.get("total_bytes") or d.get("total_bytes_estimate")
+        if d.get("status") == "downloading" and total_bytes:
+            percent = int(d.get("downloaded_bytes", 0) * 100 / total_bytes)
+            # yt-dlp calls this for every chunk; pass on whole percents only.
+            if percent != last_percent:
+                last_percent = percent
+                events.put((url, "progress", min(percent, 100) / 100))
+
+    try:
+        savepath = fetch_video(url, resolution_dropdown, progress_hook, cookies,
+                               log=lambda message: events.put((url, "info", message)))
+    except Exception as e:
+        events.put((url, "failed", str(e)))
+    else:
+        events.put((url, "done", savepath))
+
+def iter_downloads_concurrently(
+    urls: list, resolution_dropdown: str, max_workers: int = default_download_workers, cookies: str = ""
+):
+    """
+    Downloads videos on a pool of max_workers threads and yields
+    (url, event, value) from the calling (Streamlit script) thread as the
+    workers report: ("progress", fraction), ("info", message), then exactly
+    one of ("done", savepath) or ("failed", error) per URL. A failed video
+    does not stop the others. Queued downloads are cancelled if the caller
+    stops iterating; ones already running finish in the background.
+    """
+    events = queue.Queue()
+    executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="video-download")
+    try:
+        for url in urls:
+            executor.submit(_download_in_worker, url, resolution_dropdown, cookies, events)
+        remaining = len(urls)
+        while remaining:
+            url, event, value = events.get()
+            if event in ("done", "failed"):
+                remaining -= 1
+            yield url, event, value
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)